@@ -0,0 +1,165 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+from fastapi import HTTPException
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "8"))
+STT_MAX_QUEUE = int(os.getenv("STT_MAX_QUEUE", "32"))
+STT_QUEUE_TIMEOUT = float(os.getenv("STT_QUEUE_TIMEOUT", "5"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "16"))
+TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "64"))
+TTS_QUEUE_TIMEOUT = float(os.getenv("TTS_QUEUE_TIMEOUT", "5"))
+N8N_MAX_CONCURRENCY = int(os.getenv("N8N_MAX_CONCURRENCY", "16"))
+N8N_MAX_QUEUE = int(os.getenv("N8N_MAX_QUEUE", "64"))
+N8N_QUEUE_TIMEOUT = float(os.getenv("N8N_QUEUE_TIMEOUT", "5"))
+
+
+class Overloaded(HTTPException):
+    """Raised when an upstream's wait queue is full or a request waited too long for a slot."""
+
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"{upstream} is overloaded, please retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class Slot:
+    """
+    A concurrency slot held by one upstream call.
+
+    ``release`` is idempotent. A slot handed to a streaming generator that is
+    dropped without being iterated is released when it is garbage collected.
+    """
+
+    __slots__ = ("_limiter", "_released")
+
+    def __init__(self, limiter: "UpstreamLimiter"):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+    def __del__(self):
+        self.release()
+
+
+class UpstreamLimiter:
+    """
+    Bounds concurrent calls to one upstream service.
+
+    Up to ``max_concurrency`` calls run at once and up to ``max_queue`` more
+    wait for a slot. A call that finds the queue full, or waits longer than
+    ``queue_timeout`` seconds, fails immediately with 503 and a Retry-After
+    header, so a burst is shed at the edge instead of slowing every request.
+    All operations run on the event loop.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_waiting_seen = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    async def acquire(self) -> Slot:
+        """
+        Wait for a slot.
+
+        Returns:
+            The slot; call ``release`` on it when the upstream call is done
+
+        Raises:
+            Overloaded: If the wait queue is full or the wait timed out
+        """
+        # Counted synchronously, so a burst arriving in one loop iteration is bounded too
+        if self._in_flight + self._waiting >= self.max_concurrency + self.max_queue:
+            self.rejected_queue_full += 1
+            logger.warning(f"{self.name} queue full ({self._waiting} waiting), shedding request")
+            raise Overloaded(self.name, self._retry_after())
+
+        started = time.monotonic()
+        self._waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self._in_flight + self._waiting - self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            logger.warning(f"{self.name} request waited over {self.queue_timeout}s for a slot, shedding request")
+            raise Overloaded(self.name, self._retry_after())
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.admitted += 1
+        self._in_flight += 1
+        return Slot(self)
+
+    def _release(self):
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def limit(self):
+        """Hold a slot for the duration of the block."""
+        slot = await self.acquire()
+        try:
+            yield
+        finally:
+            slot.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "max_waiting_seen": self.max_waiting_seen,
+            "avg_wait_seconds": round(self.total_wait / self.admitted, 6) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_wait, 6),
+        }
+
+
+# Shared limiters, one per upstream
+stt_limiter = UpstreamLimiter("STT", STT_MAX_CONCURRENCY, STT_MAX_QUEUE, STT_QUEUE_TIMEOUT)
+tts_limiter = UpstreamLimiter("TTS", TTS_MAX_CONCURRENCY, TTS_MAX_QUEUE, TTS_QUEUE_TIMEOUT)
+n8n_limiter = UpstreamLimiter("n8n", N8N_MAX_CONCURRENCY, N8N_MAX_QUEUE, N8N_QUEUE_TIMEOUT)
+
+
+def admission_stats() -> Dict[str, Any]:
+    return {
+        "stt": stt_limiter.stats(),
+        "tts": tts_limiter.stats(),
+        "n8n": n8n_limiter.stats(),
+    }
@@ -2,8 +2,12 @@ import logging
 import os
 import json
 import base64
-from typing import Optional
-from fastapi import FastAPI, UploadFile, Form, HTTPException, BackgroundTasks, Request, Response
+import asyncio
+import time
+from urllib.parse import urlencode
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional, List
+from fastapi import FastAPI, UploadFile, Form, HTTPException, BackgroundTasks, Request, Response, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,9 +19,36 @@ required_keys = ["OPENAI_API_KEY"]
 missing_keys = [key for key in required_keys if not os.getenv(key)]
 
 # Import backend modules
-from stt import transcribe_audio
-from webhook import send_to_n8n
-from tts import text_to_speech
+from stt import transcribe_audio, transcribe_stream
+from webhook import send_to_n8n, n8n_stats, N8N_FALLBACK_TEXT, ReplyStream
+from circuit_breaker import breaker_stats
+import metrics
+import timings
+import events
+from events import event_hub, parse_last_event_id
+from pending_turns import pending_turns, N8N_MODE, N8N_MODES, N8N_CALLBACK_BASE_URL
+from tts import TTS_MEDIA_TYPE
+from tts_segments import segmented_text_to_speech, stream_segmented_speech, stream_incremental_speech
+from tts_jobs import tts_jobs
+from tts_batches import tts_batches, TTS_BATCH_MAX_ITEMS
+from tts_cache import tts_cache
+from speech_streams import speech_streams, stream_url, STREAM_URL_MAX_CHARS
+from stt_cache import stt_cache
+from http_client import start_client, close_client, pool_stats
+from upload_stream import StreamingUpload, MAX_UPLOAD_BYTES
+from artifacts import artifact_registry, audio_url
+import artifact_gc
+import audio_preprocess
+from admission import admission_stats
+from sessions import (
+    Session,
+    session_store,
+    new_session_id,
+    valid_session_id,
+    SESSION_COOKIE,
+    SESSION_HEADER,
+    SESSION_TTL,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -31,10 +62,47 @@ if missing_keys:
     logger.error(f"Missing required environment variables: {', '.join(missing_keys)}")
     logger.error("Please set these variables in your environment or .env file")
 
+async def prerender_fallback_audio():
+    """
+    Synthesize the n8n fallback reply into the TTS cache, so turns answered
+    with it while a webhook is down get their audio without calling the API.
+    """
+    if tts_cache is None:
+        return
+    try:
+        await segmented_text_to_speech(N8N_FALLBACK_TEXT)
+        logger.info("Pre-rendered n8n fallback reply")
+    except Exception as e:
+        logger.warning(f"Could not pre-render n8n fallback reply: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create shared resources at startup and release them at shutdown.
+    """
+    await start_client()
+    gc_task = asyncio.create_task(artifact_gc.run())
+    fallback_task = asyncio.create_task(prerender_fallback_audio())
+    try:
+        yield
+    finally:
+        fallback_task.cancel()
+        await tts_batches.close()
+        gc_task.cancel()
+        try:
+            await gc_task
+        except asyncio.CancelledError:
+            pass
+        await close_client()
+        audio_preprocess.shutdown()
+        if tts_cache is not None:
+            tts_cache.flush()
+
 app = FastAPI(
     title="N8N Voice Interface",
     description="A voice interface for n8n workflows using OpenAI's GPT-4o Transcribe",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -44,16 +112,72 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Turn-Id"],
 )
 
-# Store the last n8n response for retrieval
-last_n8n_response = None
-last_tts_file_path = None
+# Cached clips that get evicted must no longer be served
+if tts_cache is not None:
+    tts_cache.on_evict.append(artifact_registry.unregister)
+
+# Attach a conversation session to every request. Browsers keep the id in a
+# cookie (so <audio> requests carry it too); API clients may send X-Session-Id.
+@app.middleware("http")
+async def session_middleware(request: Request, call_next):
+    cookie_session_id = request.cookies.get(SESSION_COOKIE)
+    session_id = resolve_session_id(request)
+    request.state.session_id = session_id
+    events.current_session_id.set(session_id)
+
+    response = await call_next(request)
+
+    if cookie_session_id != session_id:
+        response.set_cookie(
+            SESSION_COOKIE, session_id, max_age=int(SESSION_TTL), httponly=True, samesite="lax"
+        )
+    return response
+
+# Paths whose responses carry a Server-Timing header and whose turns are kept in the timeline buffer
+TIMED_PATHS = ("/api/transcribe", "/api/speak")
+TIMED_PATH_PREFIXES = ("/api/webhook/",)
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    path = request.url.path
+    if path not in TIMED_PATHS and not path.startswith(TIMED_PATH_PREFIXES):
+        return await call_next(request)
+
+    timeline = timings.begin_turn(path)
+    response = await call_next(request)
+    timeline.finish(response.status_code)
+    response.headers["Server-Timing"] = timeline.server_timing()
+    response.headers["X-Turn-Id"] = timeline.turn_id
+    return response
+
+def resolve_session_id(connection) -> str:
+    """
+    Pick the session id of an HTTP request or WebSocket, or make up a new one.
+    """
+    session_id = (
+        connection.headers.get(SESSION_HEADER)
+        or connection.query_params.get("session_id")
+        or connection.cookies.get(SESSION_COOKIE)
+    )
+    return session_id if valid_session_id(session_id) else new_session_id()
+
+def current_session(request: Request) -> Session:
+    """
+    Return the conversation session of the current request.
+    """
+    return session_store.get(request.state.session_id)
 
 # Model for receiving text from n8n
 class TextRequest(BaseModel):
     text: str
 
+# Model for pre-rendering many texts at once
+class BatchTextRequest(BaseModel):
+    texts: List[str]
+
 # Response model for combined text and audio
 class AudioTextResponse(BaseModel):
     text: str
@@ -70,15 +194,91 @@ async def api_error():
         return {"status": "error", "errors": errors}
     return {"status": "ok"}
 
+# How the reply audio is delivered by /api/transcribe, chosen with the ``response_audio`` form field:
+# "none" (the client requests it separately), "url" (synthesized before responding, with its URL),
+# "inline" (as "url", with the audio embedded as base64 when small) or "stream" (a streaming URL)
+RESPONSE_AUDIO_MODES = ("none", "url", "inline", "stream")
+INLINE_AUDIO_MAX_BYTES = int(os.getenv("INLINE_AUDIO_MAX_BYTES", str(96 * 1024)))
+
+async def prepare_reply_audio(text: str, session: Session, mode: str) -> dict:
+    """
+    Make the reply audio ready for the /api/transcribe response.
+
+    Args:
+        text: The n8n reply text
+        session: The session the audio belongs to
+        mode: One of RESPONSE_AUDIO_MODES other than "none"
+
+    Returns:
+        Fields to add to the response: ``audio_url``, ``audio_base64`` and
+        ``audio_mime_type`` for inlined clips, and ``timings``. Only
+        ``timings`` if synthesis failed, so the client can fall back to /api/speak.
+    """
+    if mode == "stream" and len(text) <= STREAM_URL_MAX_CHARS:
+        # Synthesized when the client fetches it, so playback starts with the first chunk
+        return {
+            "audio_url": stream_url(speech_streams.create(text, session.session_id)),
+            "timings": timings.current_durations()
+        }
+
+    try:
+        file_path = await segmented_text_to_speech(text)
+    except Exception as e:
+        logger.error(f"Error generating TTS for n8n response: {str(e)}")
+        return {"timings": timings.current_durations()}
+    session_store.update(session, tts_file_path=file_path)
+
+    reply_audio = {"audio_url": publish_audio(file_path, session)}
+    event_hub.publish(session.session_id, "tts_ready", {"text": text, "audio_url": reply_audio["audio_url"]})
+    if mode == "inline" and os.path.getsize(file_path) <= INLINE_AUDIO_MAX_BYTES:
+        with open(file_path, "rb") as f:
+            reply_audio["audio_base64"] = base64.b64encode(f.read()).decode("ascii")
+        reply_audio["audio_mime_type"] = TTS_MEDIA_TYPE
+    reply_audio["timings"] = timings.current_durations()
+    return reply_audio
+
+def check_turn_fields(fields: dict, complete: bool):
+    """
+    Validate the text fields of an /api/transcribe upload.
+
+    Args:
+        fields: The fields parsed so far
+        complete: True once the whole body has been read; only then is a
+            missing webhook_url an error
+
+    Returns:
+        The webhook URL (None if not seen yet), the response_audio mode and the n8n mode
+    """
+    webhook_url = fields.get("webhook_url")
+    if complete and not webhook_url:
+        raise HTTPException(status_code=400, detail="Missing webhook_url")
+    response_audio = fields.get("response_audio") or "none"
+    if response_audio not in RESPONSE_AUDIO_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported response_audio: {response_audio}")
+    n8n_mode = fields.get("n8n_mode") or N8N_MODE
+    if n8n_mode not in N8N_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported n8n_mode: {n8n_mode}")
+    return webhook_url, response_audio, n8n_mode
+
 # API endpoint for transcription
 @app.post("/api/transcribe")
 async def transcribe_endpoint(
-    audio: UploadFile,
-    webhook_url: str = Form(...),
-    background_tasks: BackgroundTasks = None
+    request: Request,
+    background_tasks: BackgroundTasks = None,
+    session: Session = Depends(current_session)
 ):
     """
     Process audio, transcribe it, and send it to the n8n webhook.
+
+    Expects a multipart form with an ``audio`` file and a ``webhook_url``
+    field. The audio is streamed to the STT provider while it is uploaded.
+    Fields sent before the file are checked before transcription starts, so
+    clients should put them first; fields after the file are only checked
+    once the recording has been transcribed.
+    An optional ``response_audio`` field (see RESPONSE_AUDIO_MODES) makes the
+    reply audio part of the response. With ``n8n_mode=async`` the turn returns
+    as soon as n8n has accepted it; the reply arrives later through the
+    callback and is pushed to the session's event stream.
     """
     if missing_keys:
         raise HTTPException(
@@ -86,13 +286,29 @@ async def transcribe_endpoint(
             detail=f"Missing required environment variables: {', '.join(missing_keys)}"
         )
 
-    global last_n8n_response
-
+    started = time.perf_counter()
+    metrics.in_flight.inc("turn")
     try:
-        logger.info(f"Received audio file: {audio.filename}, size: {audio.size} bytes")
+        # Parse the upload up to the first audio bytes; limits are checked here
+        try:
+            upload = await StreamingUpload(request).open()
+        except HTTPException:
+            metrics.errors.inc("upload")
+            raise
+        logger.info(f"Receiving audio file: {upload.filename}, content-type: {upload.content_type}")
+        # Reject bad fields sent ahead of the file before paying for a transcription
+        check_turn_fields(upload.fields, complete=False)
+
+        # Transcribe the audio while it is still being received
+        transcription_result = await transcribe_stream(
+            upload.chunks(),
+            content_type=upload.content_type,
+            filename=upload.filename
+        )
+        logger.info(f"Received audio file: {upload.filename}, size: {upload.size} bytes")
 
-        # Transcribe the audio
-        transcription_result = await transcribe_audio(audio)
+        fields = await upload.finish()
+        webhook_url, response_audio, n8n_mode = check_turn_fields(fields, complete=True)
 
         if not transcription_result or not transcription_result.get("text"):
             logger.error("Transcription failed or returned empty result")
@@ -100,29 +316,60 @@ async def transcribe_endpoint(
 
         transcribed_text = transcription_result["text"]
         logger.info(f"Transcription successful: {transcribed_text[:50]}...")
+        event_hub.publish(session.session_id, "transcription", {"text": transcribed_text})
 
         # Send to n8n webhook and get response
-        n8n_response = await send_to_n8n(webhook_url, {"transcription": transcribed_text})
+        if n8n_mode == "async":
+            turn = pending_turns.add(session.session_id, webhook_url, transcribed_text)
+            try:
+                n8n_response = await send_to_n8n(webhook_url, {
+                    "transcription": transcribed_text,
+                    "correlation_id": turn.correlation_id,
+                    "callback_url": callback_url(request, turn.correlation_id)
+                })
+            except BaseException:
+                # The turn fails here; it must not also expire later as unanswered
+                pending_turns.discard(turn.correlation_id)
+                raise
+            failed = n8n_response is False or (isinstance(n8n_response, dict) and n8n_response.get("fallback"))
+            if not failed:
+                # Whatever n8n answered is only an acknowledgement; the reply comes through the callback
+                return {
+                    "success": True,
+                    "text": transcribed_text,
+                    "pending": True,
+                    "correlation_id": turn.correlation_id
+                }
+            # No callback will come - answer the turn now, like a synchronous one
+            pending_turns.discard(turn.correlation_id)
+        else:
+            n8n_response = await send_to_n8n(webhook_url, {"transcription": transcribed_text})
 
-        # Store the n8n response globally
+        # Store the n8n response in the session
         if isinstance(n8n_response, dict) and "text" in n8n_response:
-            last_n8n_response = n8n_response
+            session_store.update(session, n8n_response=n8n_response)
             logger.info(f"Stored n8n response: {n8n_response['text'][:50]}...")
+            event_hub.publish(session.session_id, "n8n_response", n8n_response)
 
             # Generate TTS for the response right away to have it ready
-            if background_tasks:
+            reply_audio = {}
+            if response_audio != "none":
+                reply_audio = await prepare_reply_audio(n8n_response["text"], session, response_audio)
+            elif background_tasks:
                 background_tasks.add_task(
                     generate_tts_for_response,
-                    n8n_response["text"]
+                    n8n_response["text"],
+                    session
                 )
             else:
-                await generate_tts_for_response(n8n_response["text"])
+                await generate_tts_for_response(n8n_response["text"], session)
 
             # Return both the transcription and the n8n response
             return {
                 "success": True,
                 "text": transcribed_text,
-                "n8nResponse": n8n_response
+                "n8nResponse": n8n_response,
+                **reply_audio
             }
 
         return {
@@ -130,48 +377,81 @@ async def transcribe_endpoint(
             "text": transcribed_text
         }
 
+    except HTTPException as e:
+        metrics.errors.inc("turn")
+        event_hub.publish(session.session_id, "error", {"stage": "turn", "detail": e.detail})
+        raise
     except Exception as e:
+        metrics.errors.inc("turn")
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        event_hub.publish(session.session_id, "error", {"stage": "turn", "detail": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        metrics.in_flight.dec("turn")
+        metrics.turn_seconds.observe(time.perf_counter() - started)
 
-# Function to generate TTS for n8n response
-async def generate_tts_for_response(text: str):
+def publish_audio(path: str, session: Session) -> str:
     """
-    Generate TTS for the n8n response and store the file path.
+    Register a TTS file in the artifact registry and return its URL.
+
+    Files from the TTS cache are content-addressed and public; anything else
+    is only served to the session that created it.
     """
-    global last_tts_file_path
+    owner = None if tts_cache is not None and tts_cache.owns(path) else session.session_id
+    return audio_url(artifact_registry.register(path, owner=owner))
+
+def callback_url(request: Request, correlation_id: str) -> str:
+    """URL n8n posts an async turn's reply to."""
+    base_url = N8N_CALLBACK_BASE_URL or str(request.base_url)
+    return f"{base_url.rstrip('/')}/api/webhook/callback?{urlencode({'correlation_id': correlation_id})}"
 
+# Function to generate TTS for n8n response
+async def generate_tts_for_response(text: str, session: Session, correlation_id: Optional[str] = None):
+    """
+    Generate TTS for the n8n response and store the file path in the session.
+    """
+    correlation = {"correlation_id": correlation_id} if correlation_id else {}
     try:
-        file_path = await text_to_speech(text)
-        last_tts_file_path = file_path
+        file_path = await segmented_text_to_speech(text)
+        session_store.update(session, tts_file_path=file_path)
         logger.info(f"Generated TTS for n8n response, saved to: {file_path}")
+        event_hub.publish(session.session_id, "tts_ready", {
+            "text": text,
+            "audio_url": publish_audio(file_path, session),
+            **correlation
+        })
     except Exception as e:
         logger.error(f"Error generating TTS for n8n response: {str(e)}")
+        event_hub.publish(session.session_id, "error", {"stage": "tts", "detail": str(e), **correlation})
 
 # Endpoint to get the last n8n response
 @app.post("/api/get-n8n-response")
-async def get_n8n_response(request: dict):
+async def get_n8n_response(request: dict, session: Session = Depends(current_session)):
     """
     Get the last n8n response, including webhook_url for verification.
     """
-    if not last_n8n_response:
+    if not session.last_n8n_response:
         raise HTTPException(status_code=404, detail="No n8n response available")
 
-    return last_n8n_response
+    return session.last_n8n_response
 
 # Modified endpoint to get the last TTS file with text in the response body, not header
 @app.get("/api/last-response-tts")
-async def get_last_response_tts():
+async def get_last_response_tts(session: Session = Depends(current_session)):
     """
     Get the TTS audio file for the last n8n response.
     """
-    global last_tts_file_path, last_n8n_response
+    last_n8n_response = session.last_n8n_response
+    last_tts_file_path = session.last_tts_file_path
 
     if not last_tts_file_path or not os.path.exists(last_tts_file_path):
         if last_n8n_response and "text" in last_n8n_response:
             # Try to generate the TTS file if it doesn't exist
             try:
-                last_tts_file_path = await text_to_speech(last_n8n_response["text"])
+                last_tts_file_path = await segmented_text_to_speech(last_n8n_response["text"])
+                session_store.update(session, tts_file_path=last_tts_file_path)
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Error generating TTS file: {str(e)}")
                 raise HTTPException(status_code=500, detail="Could not generate TTS file")
@@ -181,8 +461,8 @@ async def get_last_response_tts():
     # Get the text content
     text_content = last_n8n_response["text"] if last_n8n_response and "text" in last_n8n_response else ""
 
-    # Create a unique audio URL using the file path
-    audio_url = f"/api/audio/{os.path.basename(last_tts_file_path)}"
+    # Register the file and build its audio URL
+    audio_url = publish_audio(last_tts_file_path, session)
 
     # Return JSON with text and audio URL
     return {
@@ -190,76 +470,60 @@ async def get_last_response_tts():
         "audio_url": audio_url
     }
 
-# Endpoint to serve audio files by filename - IMPROVED VERSION
-@app.get("/api/audio/{filename}")
-async def get_audio_file(filename: str):
-    """
-    Serve an audio file by its filename.
-    """
-    global last_tts_file_path
+class ArtifactFileResponse(FileResponse):
+    """A FileResponse that counts as an open stream of its file while it is sent."""
 
-    # Szukaj pliku w katalogu tymczasowym
-    temp_dir = "/tmp"
-    file_path = os.path.join(temp_dir, filename)
+    async def __call__(self, scope, receive, send):
+        with artifact_registry.streaming(self.path):
+            await super().__call__(scope, receive, send)
 
-    # Sprawdź, czy plik istnieje bezpośrednio w katalogu tymczasowym
-    if os.path.exists(file_path):
-        logger.info(f"Serving audio file from temp dir: {file_path}")
-        return FileResponse(file_path, media_type="audio/mpeg")
+# Endpoint to serve audio files by their artifact id
+@app.get("/api/audio/{filename}")
+async def get_audio_file(filename: str, session: Session = Depends(current_session)):
+    """
+    Serve a registered audio artifact.
 
-    # Jeśli nie znaleziono pliku w temp, spróbuj użyć last_tts_file_path
-    if not last_tts_file_path or not os.path.exists(last_tts_file_path):
-        logger.error(f"Audio file not found: {filename}, last_tts_file_path: {last_tts_file_path}")
+    Unknown ids (and files owned by another session) return 404 without
+    touching the filesystem.
+    """
+    artifact = artifact_registry.get(filename)
 
-        # Ostatnia szansa - wyszukaj pliki mp3 w katalogu tymczasowym
-        try:
-            mp3_files = [f for f in os.listdir(temp_dir) if f.endswith('.mp3')]
-            if mp3_files:
-                # Użyj najnowszego pliku mp3
-                mp3_files.sort(key=lambda x: os.path.getmtime(os.path.join(temp_dir, x)), reverse=True)
-                newest_file = os.path.join(temp_dir, mp3_files[0])
-                logger.info(f"Using newest MP3 file found: {newest_file}")
-                return FileResponse(newest_file, media_type="audio/mpeg")
-        except Exception as e:
-            logger.error(f"Error searching for MP3 files: {str(e)}")
+    if artifact is None and tts_cache is not None:
+        # Cached clips from before a restart are content-addressed and public
+        cached_path = tts_cache.path_for(filename)
+        if cached_path:
+            try:
+                artifact = artifact_registry.register(cached_path)
+            except FileNotFoundError:
+                artifact = None
 
-        # Jeśli wszystkie próby zawiodły
+    if artifact is None or not artifact.visible_to(session.session_id):
         raise HTTPException(status_code=404, detail="Audio file not found")
 
-    # Walidacja, aby zapobiec path traversal
-    if os.path.basename(last_tts_file_path) != filename:
-        logger.warning(f"Filename mismatch: requested {filename}, but last TTS is {os.path.basename(last_tts_file_path)}")
-        # Zamiast odmawiać dostępu, użyj aktualnego pliku TTS
-        logger.info(f"Serving last TTS file instead: {last_tts_file_path}")
-        return FileResponse(last_tts_file_path, media_type="audio/mpeg")
-
-    # Zwróć plik bezpośrednio (szybsza metoda)
-    logger.info(f"Serving audio file from last_tts_file_path: {last_tts_file_path}")
-    return FileResponse(last_tts_file_path, media_type="audio/mpeg")
+    artifact_registry.touch(artifact)
+    return ArtifactFileResponse(artifact.path, media_type=artifact.content_type, stat_result=artifact.stat)
 
 # New endpoint to receive text from n8n and convert to speech
 @app.post("/api/speak")
-async def speak_endpoint(request: TextRequest):
+async def speak_endpoint(request: TextRequest, session: Session = Depends(current_session)):
     """
     Receive text and convert it to speech.
     """
-    global last_n8n_response, last_tts_file_path
-
     try:
         text = request.text
         logger.info(f"Received text for TTS: {text[:50]}...")
 
         # Store this as the last n8n response for convenience
-        last_n8n_response = {"text": text}
+        session_store.update(session, n8n_response={"text": text})
 
         # Convert text to speech
-        audio_path = await text_to_speech(text)
+        audio_path = await segmented_text_to_speech(text)
 
         # Store the TTS file path
-        last_tts_file_path = audio_path
+        session_store.update(session, tts_file_path=audio_path)
 
-        # Create a unique audio URL using the file path
-        audio_url = f"/api/audio/{os.path.basename(audio_path)}"
+        # Register the file and build its audio URL
+        audio_url = publish_audio(audio_path, session)
 
         # Return JSON with text and audio URL instead of FileResponse
         return {
@@ -267,22 +531,165 @@ async def speak_endpoint(request: TextRequest):
             "audio_url": audio_url
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing speak request: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Streaming variant of /api/speak - audio is sent to the client as it is synthesized
+@app.post("/api/speak/stream")
+async def speak_stream_endpoint(request: TextRequest, session: Session = Depends(current_session)):
+    """
+    Register text for streamed speech and return the URL its audio streams from.
+
+    The ``audio_url`` can be used directly as an ``<audio>`` source; synthesis
+    starts when it is fetched. Texts longer than STREAM_URL_MAX_CHARS are
+    synthesized before responding instead, like /api/speak.
+    """
+    text = request.text
+    if not text:
+        raise HTTPException(status_code=400, detail="Missing text")
+    if len(text) > STREAM_URL_MAX_CHARS:
+        return await speak_endpoint(request, session)
+
+    # Store this as the last n8n response for convenience
+    session_store.update(session, n8n_response={"text": text})
+    stream_id = speech_streams.create(text, session.session_id)
+    return {
+        "text": text,
+        "stream_id": stream_id,
+        "audio_url": stream_url(stream_id)
+    }
+
+# GET form so the URL can be used directly as an <audio> source
+@app.get("/api/speak/stream/{stream_id}")
+async def speak_stream_get_endpoint(stream_id: str, session: Session = Depends(current_session)):
+    """
+    Stream the synthesized speech for a text registered with POST /api/speak/stream.
+    """
+    text = speech_streams.get(stream_id, session.session_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Speech stream not found or expired")
+    return await _speech_stream_response(text, session, remember=False)
+
+# Streaming variant of /api/last-response-tts
+@app.get("/api/last-response-tts/stream")
+async def last_response_tts_stream(session: Session = Depends(current_session)):
+    """
+    Stream the speech for the last n8n response.
+    """
+    if not session.last_n8n_response or "text" not in session.last_n8n_response:
+        raise HTTPException(status_code=404, detail="No n8n response available")
+
+    return await _speech_stream_response(session.last_n8n_response["text"], session, remember=False)
+
+async def _speech_stream_response(text: str, session: Session, remember: bool = True) -> StreamingResponse:
+    """
+    Start a streaming TTS request and wrap it in a chunked response.
+    """
+    if not text:
+        raise HTTPException(status_code=400, detail="Missing text")
+
+    logger.info(f"Received text for streaming TTS: {text[:50]}...")
+
+    # Store this as the last n8n response for convenience
+    if remember:
+        session_store.update(session, n8n_response={"text": text})
+
+    try:
+        audio_stream = await stream_segmented_speech(text)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting TTS stream: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        audio_stream,
+        media_type=TTS_MEDIA_TYPE,
+        headers={"Cache-Control": "no-store"}
+    )
+
+# Pre-render many texts into the TTS cache, e.g. the fixed prompts of a workflow
+@app.post("/api/speak/batch", status_code=202)
+async def speak_batch_endpoint(request: BatchTextRequest, stream: bool = False,
+                               session: Session = Depends(current_session)):
+    """
+    Synthesize a list of texts in the background, so later turns saying them are served from the cache.
+
+    Returns the batch id and the URLs to poll or stream its progress. With
+    ``?stream=true`` the progress stream itself is returned: one NDJSON line
+    per distinct text as its audio is ready, then a summary line.
+    """
+    if tts_cache is None:
+        # Without the cache the audio could neither be reused nor fetched later
+        raise HTTPException(status_code=503, detail="TTS batches need the TTS cache (TTS_CACHE_ENABLED=true)")
+    texts = request.texts
+    if not texts:
+        raise HTTPException(status_code=400, detail="Missing texts")
+    if len(texts) > TTS_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many texts ({len(texts)}, limit {TTS_BATCH_MAX_ITEMS})")
+    if any(not text.strip() for text in texts):
+        raise HTTPException(status_code=400, detail="Empty text in batch")
+
+    # Public like cached clips: the URLs are handed to n8n, which has no session
+    job = tts_batches.submit(texts, lambda path: audio_url(artifact_registry.register(path, owner=None)))
+    if stream:
+        return StreamingResponse(
+            job.progress(),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-store", "X-Batch-Id": job.batch_id}
+        )
+    return {
+        **job.summary(),
+        "status_url": f"/api/speak/batch/{job.batch_id}",
+        "stream_url": f"/api/speak/batch/{job.batch_id}/stream"
+    }
+
+# Status of a pre-render batch, with the audio URL of every finished text
+@app.get("/api/speak/batch/{batch_id}")
+async def speak_batch_status(batch_id: str):
+    """
+    Return the progress of a batch and the result of each distinct text.
+    """
+    job = tts_batches.get(batch_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job.to_dict()
+
+# Progress of a pre-render batch as it happens
+@app.get("/api/speak/batch/{batch_id}/stream")
+async def speak_batch_stream(batch_id: str):
+    """
+    Stream a batch's results as NDJSON, starting with the texts already finished.
+    """
+    job = tts_batches.get(batch_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return StreamingResponse(
+        job.progress(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store"}
+    )
+
 # Webhook endpoint that can handle both receiving text from n8n and sending transcriptions to n8n
 @app.post("/api/webhook/{webhook_id}")
 async def webhook_endpoint(
     webhook_id: str,
     request: Request,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    session: Session = Depends(current_session)
 ):
     """
     Bidirectional webhook endpoint for n8n integration.
     Can receive text from n8n and return audio, or receive audio and send text to n8n.
+
+    Text sent by n8n can carry a ``session_id`` field to deliver the reply to
+    a specific conversation. Replies to async turns carry the turn's
+    ``correlation_id`` (in the callback URL or the body); they are accepted
+    right away with 202 and their TTS is pushed to the waiting session.
     """
-    global last_n8n_response, last_tts_file_path
     content_type = request.headers.get("content-type", "")
 
     try:
@@ -302,9 +709,9 @@ async def webhook_endpoint(
             # Send to n8n webhook
             n8n_response = await send_to_n8n(webhook_url, {"transcription": transcribed_text})
 
-            # Store the response globally
+            # Store the response in the session
             if isinstance(n8n_response, dict) and "text" in n8n_response:
-                last_n8n_response = n8n_response
+                session_store.update(session, n8n_response=n8n_response)
 
             return {
                 "success": True,
@@ -319,17 +726,46 @@ async def webhook_endpoint(
             if "text" not in body:
                 raise HTTPException(status_code=400, detail="Missing 'text' field in request body")
 
+            correlation_id = request.query_params.get("correlation_id") or body.get("correlation_id")
+            if correlation_id:
+                turn = pending_turns.complete(correlation_id)
+                if turn is None:
+                    raise HTTPException(status_code=410, detail="Unknown or expired correlation_id")
+                session = session_store.get(turn.session_id)
+                events.current_session_id.set(session.session_id)
+                n8n_response = {"text": body["text"], "correlation_id": correlation_id}
+                session_store.update(session, n8n_response=n8n_response)
+                event_hub.publish(session.session_id, "n8n_response", {
+                    **n8n_response,
+                    "source": "webhook",
+                    "transcription": turn.transcription
+                })
+                # Synthesize after answering, so the workflow isn't kept waiting for TTS
+                background_tasks.add_task(generate_tts_for_response, body["text"], session, correlation_id)
+                return JSONResponse({"accepted": True, "correlation_id": correlation_id}, status_code=202)
+
+            # n8n calls back without the browser's cookie, so it may name the session
+            if valid_session_id(body.get("session_id")):
+                session = session_store.get(body["session_id"])
+                events.current_session_id.set(session.session_id)
+
             # Store as last n8n response
-            last_n8n_response = {"text": body["text"]}
+            session_store.update(session, n8n_response={"text": body["text"]})
+            event_hub.publish(session.session_id, "n8n_response", {"text": body["text"], "source": "webhook"})
 
             # Convert text to speech
-            audio_path = await text_to_speech(body["text"])
+            try:
+                audio_path = await segmented_text_to_speech(body["text"])
+            except Exception as e:
+                event_hub.publish(session.session_id, "error", {"stage": "tts", "detail": str(e)})
+                raise
 
             # Store the TTS file path
-            last_tts_file_path = audio_path
+            session_store.update(session, tts_file_path=audio_path)
 
-            # Create a unique audio URL using the file path
-            audio_url = f"/api/audio/{os.path.basename(audio_path)}"
+            # Register the file and build its audio URL
+            audio_url = publish_audio(audio_path, session)
+            event_hub.publish(session.session_id, "tts_ready", {"text": body["text"], "audio_url": audio_url})
 
             # Return JSON with text and audio URL
             return {
@@ -337,10 +773,282 @@ async def webhook_endpoint(
                 "audio_url": audio_url
             }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing webhook request: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Server-Sent Events stream of the session's turns
+@app.get("/api/events")
+async def events_endpoint(request: Request, last_event_id: Optional[str] = None,
+                          session: Session = Depends(current_session)):
+    """
+    Push the session's events as they happen: ``transcription``, ``n8n_response``
+    (including replies n8n posts to /api/webhook/{webhook_id}), ``tts_segment``,
+    ``tts_ready`` and ``error``.
+
+    Reconnecting clients send ``Last-Event-ID`` (or ``?last_event_id=``) and
+    receive the events they missed.
+    """
+    resume_from = parse_last_event_id(request.headers.get("last-event-id") or last_event_id)
+    return StreamingResponse(
+        event_hub.stream(session.session_id, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+# Counters of each subsystem, keyed by the name used in /api/stats
+STATS_PROVIDERS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "admission": admission_stats,
+    "artifacts": lambda: {**artifact_registry.stats(), "gc": artifact_gc.gc_stats()},
+    "audio_preprocess": audio_preprocess.preprocess_stats,
+    "circuit_breakers": breaker_stats,
+    "events": event_hub.stats,
+    "http_pool": pool_stats,
+    "n8n": n8n_stats,
+    "pending_turns": pending_turns.stats,
+    "sessions": session_store.stats,
+    "speech_streams": speech_streams.stats,
+    "stt_cache": lambda: stt_cache.stats() if stt_cache is not None else {"enabled": False},
+    "tts_batches": tts_batches.stats,
+    "tts_cache": lambda: tts_cache.stats() if tts_cache is not None else {"enabled": False},
+    "tts_jobs": tts_jobs.stats,
+}
+
+@app.get("/api/stats")
+async def stats_endpoint():
+    """
+    Return the counters of every subsystem, keyed by subsystem name.
+    """
+    return {name: provider() for name, provider in STATS_PROVIDERS.items()}
+
+@app.get("/api/stats/{subsystem}")
+async def subsystem_stats(subsystem: str):
+    """
+    Return the counters of one subsystem, e.g. ``/api/stats/tts_cache``.
+    """
+    provider = STATS_PROVIDERS.get(subsystem)
+    if provider is None:
+        raise HTTPException(status_code=404, detail=f"Unknown subsystem '{subsystem}'")
+    return provider()
+
+# Prometheus metrics endpoint
+@app.get("/api/metrics")
+async def metrics_endpoint():
+    """
+    Return latency/size histograms, error counters and in-flight gauges in the Prometheus text format.
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Per-turn stage timelines for debugging slow turns
+@app.get("/api/debug/timelines")
+async def debug_timelines(limit: int = 50):
+    """
+    Return the stage timelines of recent turns, newest first.
+    """
+    return {"timelines": timings.recent(min(limit, timings.TIMELINE_BUFFER_SIZE))}
+
+@app.get("/api/debug/timelines/{turn_id}")
+async def debug_timeline(turn_id: str):
+    """
+    Return the stage timeline of one turn, by the id sent in its X-Turn-Id header.
+    """
+    timeline = timings.find(turn_id)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail="Unknown turn id")
+    return timeline.as_dict()
+
+# Full-duplex voice endpoint: one connection for upload, transcription, n8n reply and audio
+@app.websocket("/ws/voice")
+async def voice_websocket(websocket: WebSocket):
+    """
+    Run voice turns over a single WebSocket connection.
+
+    Protocol (client -> server):
+      - JSON ``{"type": "start", "webhook_url": "...", "content_type": "audio/webm"}``
+        begins an utterance; ``webhook_url`` may also be given as a query parameter.
+      - Binary frames carry the audio as it is recorded. They are streamed to
+        the STT provider immediately, while the user is still speaking.
+      - JSON ``{"type": "end"}`` finishes the utterance.
+
+    Protocol (server -> client), per turn:
+      - ``{"type": "transcription", "text": ...}``
+      - ``{"type": "n8n", "text": ...}`` (or ``{"type": "n8n", "text": null}`` if n8n sent no text)
+      - ``{"type": "audio_start", "content_type": ...}``, binary audio frames, ``{"type": "audio_end"}``
+      - ``{"type": "error", "stage": ..., "detail": ...}`` if a stage fails
+
+    The connection stays open for further turns.
+    """
+    await websocket.accept()
+    session = session_store.get(resolve_session_id(websocket))
+    default_webhook_url = websocket.query_params.get("webhook_url")
+    await websocket.send_json({"type": "ready", "session_id": session.session_id})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is None:
+                # Audio outside of an utterance is ignored
+                continue
+
+            try:
+                command = json.loads(message["text"])
+            except json.JSONDecodeError:
+                await websocket.send_json({"type": "error", "stage": "protocol", "detail": "Invalid JSON message"})
+                continue
+
+            if command.get("type") != "start":
+                await websocket.send_json({"type": "error", "stage": "protocol", "detail": "Expected a start message"})
+                continue
+
+            webhook_url = command.get("webhook_url") or default_webhook_url
+            if not webhook_url:
+                await websocket.send_json({"type": "error", "stage": "protocol", "detail": "Missing webhook_url"})
+                continue
+
+            if not await _voice_turn(websocket, session, webhook_url, command.get("content_type") or "audio/webm"):
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        logger.info(f"Voice WebSocket closed for session {session.session_id}")
+
+async def _voice_turn(websocket: WebSocket, session: Session, webhook_url: str, content_type: str) -> bool:
+    """
+    Handle one utterance on the voice WebSocket.
+
+    Returns:
+        False if the client disconnected, True otherwise
+    """
+    # Bounded queue: if the STT upload falls behind, we stop reading the socket
+    queue: asyncio.Queue = asyncio.Queue(maxsize=32)
+    timeline = timings.begin_turn("/ws/voice")
+
+    async def queued_chunks():
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    stt_task = asyncio.create_task(
+        transcribe_stream(queued_chunks(), content_type=content_type, filename="websocket")
+    )
+    received = 0
+    connected = True
+    started = time.perf_counter()
+    metrics.in_flight.inc("turn")
+
+    try:
+        # Feed audio frames to the STT upload until the client ends the utterance
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                connected = False
+                return False
+
+            if message.get("bytes") is not None:
+                received += len(message["bytes"])
+                if received > MAX_UPLOAD_BYTES:
+                    await websocket.send_json({"type": "error", "stage": "upload", "detail": "Recording too large"})
+                    return True
+                if not stt_task.done():
+                    put = asyncio.ensure_future(queue.put(message["bytes"]))
+                    await asyncio.wait([put, stt_task], return_when=asyncio.FIRST_COMPLETED)
+                    put.cancel()
+                continue
+
+            try:
+                command = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                command = {}
+            if command.get("type") == "end":
+                break
+
+        # Close the upload and wait for the transcription
+        if not stt_task.done():
+            await queue.put(None)
+        try:
+            transcription_result = await stt_task
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "stage": "stt", "detail": e.detail})
+            return True
+
+        transcribed_text = (transcription_result or {}).get("text")
+        if not transcribed_text:
+            await websocket.send_json({"type": "error", "stage": "stt", "detail": "Transcription failed"})
+            return True
+        await websocket.send_json({"type": "transcription", "text": transcribed_text})
+
+        # Ask n8n
+        try:
+            n8n_response = await send_to_n8n(webhook_url, {"transcription": transcribed_text}, allow_stream=True)
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "stage": "n8n", "detail": e.detail})
+            return True
+        if isinstance(n8n_response, dict) and "text_stream" in n8n_response:
+            return await _speak_streamed_reply(websocket, session, n8n_response["text_stream"])
+        if not (isinstance(n8n_response, dict) and "text" in n8n_response):
+            await websocket.send_json({"type": "n8n", "text": None})
+            return True
+        session_store.update(session, n8n_response=n8n_response)
+        await websocket.send_json({"type": "n8n", "text": n8n_response["text"]})
+
+        # Stream the spoken reply
+        try:
+            audio_stream = await stream_segmented_speech(n8n_response["text"])
+        except Exception as e:
+            logger.error(f"Error starting TTS stream for WebSocket turn: {str(e)}")
+            await websocket.send_json({"type": "error", "stage": "tts", "detail": str(e)})
+            return True
+
+        await websocket.send_json({"type": "audio_start", "content_type": TTS_MEDIA_TYPE})
+        async for chunk in audio_stream:
+            await websocket.send_bytes(chunk)
+        await websocket.send_json({"type": "audio_end"})
+        return True
+
+    except WebSocketDisconnect:
+        connected = False
+        return False
+    finally:
+        metrics.in_flight.dec("turn")
+        metrics.turn_seconds.observe(time.perf_counter() - started)
+        timeline.finish()
+        if not stt_task.done():
+            stt_task.cancel()
+        if not connected:
+            logger.info("Voice WebSocket client disconnected during a turn")
+
+async def _speak_streamed_reply(websocket: WebSocket, session: Session, reply: ReplyStream) -> bool:
+    """
+    Speak an n8n reply that is still streaming, sentence by sentence as it arrives.
+
+    The audio is sent first; the ``n8n`` message with the whole text follows
+    ``audio_end``.
+    """
+    try:
+        await websocket.send_json({"type": "audio_start", "content_type": TTS_MEDIA_TYPE})
+        async for chunk in stream_incremental_speech(reply):
+            await websocket.send_bytes(chunk)
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.error(f"Error speaking streamed n8n reply: {str(e)}")
+        await websocket.send_json({"type": "error", "stage": "tts", "detail": str(e)})
+        return True
+    finally:
+        await reply.aclose()
+    await websocket.send_json({"type": "audio_end"})
+
+    text = reply.text.strip()
+    session_store.update(session, n8n_response={"text": text})
+    await websocket.send_json({"type": "n8n", "text": text})
+    return True
+
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
@@ -0,0 +1,177 @@
+import os
+import time
+import asyncio
+import logging
+from typing import List, Tuple, Dict, Any
+from artifacts import artifact_registry, ARTIFACT_DIR
+from tts_cache import tts_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+ARTIFACT_GC_INTERVAL = float(os.getenv("ARTIFACT_GC_INTERVAL", "60"))
+ARTIFACT_MAX_AGE = float(os.getenv("ARTIFACT_MAX_AGE", "3600"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+ARTIFACT_MAX_FILES = int(os.getenv("ARTIFACT_MAX_FILES", "5000"))
+# Files served or registered this recently are never deleted; files being streamed never are
+ARTIFACT_GC_GRACE = float(os.getenv("ARTIFACT_GC_GRACE", "300"))
+# Partial files are still being written by a TTS stream unless they are this old
+PARTIAL_MAX_AGE = 3600.0
+
+
+class SweepStats:
+    """Counters reported by the artifact garbage collector."""
+
+    def __init__(self):
+        self.sweeps = 0
+        self.files_deleted = 0
+        self.bytes_reclaimed = 0
+        self.skipped_in_use = 0
+        self.last_sweep_seconds = 0.0
+        self.last_sweep_at = 0.0
+        self.files_remaining = 0
+        self.bytes_remaining = 0
+
+
+stats = SweepStats()
+
+
+def _scan() -> List[Tuple[str, int, float]]:
+    """List (path, size, mtime) of all files the collector manages. Runs in a worker thread."""
+    files = []
+
+    def add(directory: str, keep) -> None:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False) or not keep(entry.name):
+                        continue
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((entry.path, info.st_size, info.st_mtime))
+        except FileNotFoundError:
+            pass
+
+    add(ARTIFACT_DIR, lambda name: True)
+
+    # The TTS cache bounds itself; only leftovers of interrupted writes are collected there
+    if tts_cache is not None:
+        add(tts_cache.cache_dir, lambda name: name.endswith(".part"))
+
+    return files
+
+
+def _select(files: List[Tuple[str, int, float]], now: float) -> List[Tuple[str, int]]:
+    """Pick files to delete: expired ones first, then the oldest until within budget."""
+    files.sort(key=lambda item: item[2])
+    total_bytes = sum(size for _, size, _ in files)
+    total_files = len(files)
+    selected = []
+
+    for path, size, mtime in files:
+        age = now - mtime
+        is_partial = path.endswith(".part")
+        if is_partial and age < PARTIAL_MAX_AGE:
+            continue
+
+        over_budget = total_bytes > ARTIFACT_MAX_BYTES or total_files > ARTIFACT_MAX_FILES
+        if age <= ARTIFACT_MAX_AGE and not over_budget:
+            continue
+        if age < ARTIFACT_GC_GRACE and not is_partial:
+            # Too recent to be safe even when over budget
+            continue
+
+        if artifact_registry.is_streaming(path):
+            stats.skipped_in_use += 1
+            continue
+        artifact = artifact_registry.get(os.path.basename(path))
+        if artifact is not None and artifact.path == path and now - artifact.last_access < ARTIFACT_GC_GRACE:
+            stats.skipped_in_use += 1
+            continue
+
+        selected.append((path, size))
+        total_bytes -= size
+        total_files -= 1
+
+    stats.files_remaining = total_files
+    stats.bytes_remaining = total_bytes
+    return selected
+
+
+def _delete(paths: List[Tuple[str, int]]) -> Tuple[int, int]:
+    """Delete files and return (count, bytes). Runs in a worker thread."""
+    deleted = 0
+    reclaimed = 0
+    for path, size in paths:
+        try:
+            os.remove(path)
+            deleted += 1
+            reclaimed += size
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to delete audio artifact {path}: {str(e)}")
+    return deleted, reclaimed
+
+
+async def sweep():
+    """
+    Run one collection pass.
+
+    Directory scans and deletions run in a worker thread; selection and
+    registry updates run on the event loop, so a file is unregistered (and
+    can no longer start being served) before it is deleted.
+    """
+    started = time.monotonic()
+    files = await asyncio.to_thread(_scan)
+    selected = _select(files, time.time())
+
+    for path, _ in selected:
+        artifact = artifact_registry.get(os.path.basename(path))
+        if artifact is not None and artifact.path == path:
+            artifact_registry.unregister(artifact.artifact_id)
+
+    deleted, reclaimed = await asyncio.to_thread(_delete, selected) if selected else (0, 0)
+
+    stats.sweeps += 1
+    stats.files_deleted += deleted
+    stats.bytes_reclaimed += reclaimed
+    stats.last_sweep_seconds = time.monotonic() - started
+    stats.last_sweep_at = time.time()
+    if deleted:
+        logger.info(f"Artifact GC removed {deleted} files ({reclaimed} bytes) in {stats.last_sweep_seconds:.3f}s")
+
+
+async def run():
+    """Sweep periodically until cancelled. Started from the application lifespan."""
+    logger.info(
+        f"Artifact GC started (interval={ARTIFACT_GC_INTERVAL}s, max_age={ARTIFACT_MAX_AGE}s, "
+        f"max_bytes={ARTIFACT_MAX_BYTES}, max_files={ARTIFACT_MAX_FILES})"
+    )
+    while True:
+        try:
+            await sweep()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Artifact GC sweep failed: {str(e)}", exc_info=True)
+        await asyncio.sleep(ARTIFACT_GC_INTERVAL)
+
+
+def gc_stats() -> Dict[str, Any]:
+    return {
+        "sweeps": stats.sweeps,
+        "files_deleted": stats.files_deleted,
+        "bytes_reclaimed": stats.bytes_reclaimed,
+        "skipped_in_use": stats.skipped_in_use,
+        "last_sweep_seconds": round(stats.last_sweep_seconds, 6),
+        "last_sweep_at": stats.last_sweep_at,
+        "files_remaining": stats.files_remaining,
+        "bytes_remaining": stats.bytes_remaining,
+        "max_age_seconds": ARTIFACT_MAX_AGE,
+        "max_bytes": ARTIFACT_MAX_BYTES,
+        "max_files": ARTIFACT_MAX_FILES,
+    }
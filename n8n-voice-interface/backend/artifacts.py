@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional, Dict, Any
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "audio"))
+
+CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".opus": "audio/ogg",
+    ".ogg": "audio/ogg",
+    ".aac": "audio/aac",
+    ".flac": "audio/flac",
+    ".wav": "audio/wav",
+    ".pcm": "audio/L16",
+}
+
+os.makedirs(ARTIFACT_DIR, exist_ok=True)
+
+
+class Artifact:
+    """An audio file that can be served through /api/audio/{artifact_id}."""
+
+    __slots__ = ("artifact_id", "path", "size", "content_type", "owner", "created_at", "last_access", "stat")
+
+    def __init__(self, artifact_id: str, path: str, content_type: str, owner: Optional[str], stat: os.stat_result):
+        self.artifact_id = artifact_id
+        self.path = path
+        self.size = stat.st_size
+        self.content_type = content_type
+        self.owner = owner
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.stat = stat
+
+    def visible_to(self, session_id: Optional[str]) -> bool:
+        """Public artifacts (owner None) are visible to everyone, others only to their owner."""
+        return self.owner is None or self.owner == session_id
+
+
+class ArtifactRegistry:
+    """
+    In-memory map from artifact ids to audio files.
+
+    Files are stat'ed once when registered; serving an artifact afterwards
+    only needs the dictionary lookup and the open of the file itself. The
+    registry also counts the responses currently reading each file, so the
+    garbage collector can leave them alone. All operations run on the event
+    loop.
+    """
+
+    def __init__(self):
+        self._artifacts: Dict[str, Artifact] = {}
+        self._total_bytes = 0
+        self._open_streams: Dict[str, int] = {}
+
+    def register(self, path: str, owner: Optional[str] = None, content_type: Optional[str] = None) -> Artifact:
+        """
+        Register a file under its basename.
+
+        Args:
+            path: Path of the audio file
+            owner: Session id allowed to fetch it, or None for a public artifact
+            content_type: MIME type; guessed from the extension if not given
+
+        Returns:
+            The registered artifact
+        """
+        artifact_id = os.path.basename(path)
+        existing = self._artifacts.get(artifact_id)
+        if existing is not None and existing.path == path:
+            self.touch(existing)
+            return existing
+
+        if content_type is None:
+            content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+        artifact = Artifact(artifact_id, path, content_type, owner, os.stat(path))
+        self.unregister(artifact_id)
+        self._artifacts[artifact_id] = artifact
+        self._total_bytes += artifact.size
+        return artifact
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        return self._artifacts.get(artifact_id)
+
+    def touch(self, artifact: Artifact):
+        """Mark an artifact as being served, protecting it from garbage collection for a while."""
+        artifact.last_access = time.time()
+
+    @contextmanager
+    def streaming(self, path: str) -> Iterator[None]:
+        """Count the file as being read by a response until the block exits."""
+        self._open_streams[path] = self._open_streams.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            remaining = self._open_streams[path] - 1
+            if remaining:
+                self._open_streams[path] = remaining
+            else:
+                del self._open_streams[path]
+
+    def is_streaming(self, path: str) -> bool:
+        return path in self._open_streams
+
+    def unregister(self, artifact_id: str) -> Optional[Artifact]:
+        artifact = self._artifacts.pop(artifact_id, None)
+        if artifact is not None:
+            self._total_bytes -= artifact.size
+        return artifact
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "artifacts": len(self._artifacts),
+            "bytes": self._total_bytes,
+            "open_streams": sum(self._open_streams.values()),
+            "directory": ARTIFACT_DIR,
+        }
+
+
+def audio_url(artifact: Artifact) -> str:
+    """Return the URL under which an artifact is served."""
+    return f"/api/audio/{artifact.artifact_id}"
+
+
+# Shared registry used by app.py
+artifact_registry = ArtifactRegistry()
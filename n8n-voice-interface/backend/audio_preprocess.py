@@ -0,0 +1,284 @@
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, Tuple
+import timings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+AUDIO_TRIM_ENABLED = os.getenv("AUDIO_TRIM_ENABLED", "false").lower() in ("1", "true", "yes")
+AUDIO_TRANSCODE_ENABLED = os.getenv("AUDIO_TRANSCODE_ENABLED", "false").lower() in ("1", "true", "yes")
+AUDIO_TRANSCODE_FORMAT = os.getenv("AUDIO_TRANSCODE_FORMAT", "ogg")
+AUDIO_TRANSCODE_SAMPLE_RATE = int(os.getenv("AUDIO_TRANSCODE_SAMPLE_RATE", "16000"))
+AUDIO_TRANSCODE_BITRATE = os.getenv("AUDIO_TRANSCODE_BITRATE", "24k")
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+SILENCE_MIN_LEN_MS = int(os.getenv("SILENCE_MIN_LEN_MS", "400"))  # shorter pauses are kept as-is
+SILENCE_THRESHOLD_DB = float(os.getenv("SILENCE_THRESHOLD_DB", "-16"))  # relative to the recording's loudness
+SILENCE_FLOOR_DBFS = float(os.getenv("SILENCE_FLOOR_DBFS", "-45"))  # anything quieter is never speech
+SILENCE_KEEP_MS = int(os.getenv("SILENCE_KEEP_MS", "200"))  # padding kept around speech
+MIN_SPEECH_MS = int(os.getenv("MIN_SPEECH_MS", "250"))  # less voiced audio than this counts as no speech
+
+# pydub is optional - preprocessing is disabled without it
+try:
+    from pydub import AudioSegment
+    from pydub.silence import detect_nonsilent
+    PYDUB_AVAILABLE = True
+except ImportError:
+    PYDUB_AVAILABLE = False
+
+# MIME type sent to the STT provider, per file extension
+AUDIO_TYPES = {
+    ".webm": "audio/webm",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".mp3": "audio/mp3",
+    ".flac": "audio/flac",
+}
+
+# pydub/ffmpeg (format, codec) used to encode audio, per file extension
+EXPORT_FORMATS = {
+    ".wav": ("wav", None),
+    ".webm": ("webm", "libopus"),
+    ".ogg": ("ogg", "libopus"),
+    ".mp3": ("mp3", None),
+    ".m4a": ("mp4", "aac"),
+    ".flac": ("flac", None),
+}
+LOSSLESS_EXTENSIONS = (".wav", ".flac")
+
+TRANSCODE_EXTENSION = f".{AUDIO_TRANSCODE_FORMAT.lstrip('.').lower()}"
+if TRANSCODE_EXTENSION not in EXPORT_FORMATS:
+    logger.warning(f"Unsupported AUDIO_TRANSCODE_FORMAT {AUDIO_TRANSCODE_FORMAT}, using ogg")
+    TRANSCODE_EXTENSION = ".ogg"
+
+
+def sniff_audio_type(head: bytes, content_type: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Identify the container of a recording from its first bytes.
+
+    Browsers report inconsistent content types (codecs parameters, ``audio/x-wav``,
+    ``video/webm``...), so the magic bytes are checked first and the reported
+    content type is only used when they are inconclusive.
+
+    Args:
+        head: The first bytes of the recording (at least 12 for a reliable match)
+        content_type: The content type reported by the client
+
+    Returns:
+        A (file_extension, mime_type_for_api) tuple
+    """
+    file_extension = None
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        file_extension = ".wav"
+    elif head[:4] == b"OggS":
+        file_extension = ".ogg"
+    elif head[:4] == b"\x1a\x45\xdf\xa3":
+        file_extension = ".webm"
+    elif head[4:8] == b"ftyp":
+        file_extension = ".m4a"
+    elif head[:4] == b"fLaC":
+        file_extension = ".flac"
+    elif head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        file_extension = ".mp3"
+
+    if file_extension is None:
+        # Extract base content type without codecs info
+        base_content_type = (content_type or "audio/mpeg").split(';')[0].strip().lower()
+        file_extension = ".mp3"  # Default
+        if "webm" in base_content_type:
+            file_extension = ".webm"
+        elif "wav" in base_content_type or "wave" in base_content_type:
+            file_extension = ".wav"
+        elif "ogg" in base_content_type or "opus" in base_content_type:
+            file_extension = ".ogg"
+        elif "mp4" in base_content_type or "m4a" in base_content_type or "aac" in base_content_type:
+            file_extension = ".m4a"
+        elif "flac" in base_content_type:
+            file_extension = ".flac"
+
+    return file_extension, AUDIO_TYPES[file_extension]
+
+
+class PreprocessResult:
+    """Outcome of the preprocessing stage."""
+
+    __slots__ = ("data", "extension", "has_speech", "original_seconds", "output_seconds", "bytes_saved")
+
+    def __init__(self, data: bytes, extension: str, has_speech: bool, original_seconds: float,
+                 output_seconds: float, bytes_saved: int):
+        self.data = data
+        self.extension = extension
+        self.has_speech = has_speech
+        self.original_seconds = original_seconds
+        self.output_seconds = output_seconds
+        self.bytes_saved = bytes_saved
+
+    @property
+    def mime_type(self) -> str:
+        return AUDIO_TYPES[self.extension]
+
+    @property
+    def seconds_saved(self) -> float:
+        return max(self.original_seconds - self.output_seconds, 0.0)
+
+
+class PreprocessStats:
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.skipped_no_speech = 0
+        self.transcoded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds_saved = 0.0
+
+
+stats = PreprocessStats()
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _process(data: bytes, extension: str, trim: bool,
+             transcode: bool) -> Tuple[Optional[bytes], str, bool, float, float]:
+    """
+    Decode a recording once, optionally trim silence and re-encode it.
+
+    Runs in a worker process.
+
+    Returns:
+        (encoded audio or None if nothing changed, its extension, has_speech,
+        original_seconds, output_seconds)
+    """
+    input_format = extension.lstrip(".") if extension in (".wav", ".webm", ".ogg", ".mp3", ".flac") else None
+    audio = AudioSegment.from_file(io.BytesIO(data), format=input_format)
+    original_seconds = len(audio) / 1000.0
+    changed = False
+
+    if trim:
+        if audio.dBFS == float("-inf"):
+            return None, extension, False, original_seconds, 0.0
+
+        # The relative threshold alone follows steady background noise down,
+        # so a quiet, noisy recording would always look voiced
+        regions = detect_nonsilent(
+            audio,
+            min_silence_len=SILENCE_MIN_LEN_MS,
+            silence_thresh=max(audio.dBFS + SILENCE_THRESHOLD_DB, SILENCE_FLOOR_DBFS)
+        )
+        voiced_ms = sum(end - start for start, end in regions)
+        if voiced_ms < MIN_SPEECH_MS:
+            return None, extension, False, original_seconds, 0.0
+
+        # Keep each voiced region with a little padding; long pauses shrink to 2 * padding
+        trimmed = AudioSegment.empty()
+        for start, end in regions:
+            trimmed += audio[max(start - SILENCE_KEEP_MS, 0):min(end + SILENCE_KEEP_MS, len(audio))]
+        if len(trimmed) < len(audio):
+            audio = trimmed
+            changed = True
+
+    if transcode:
+        # Speech recognition gains nothing from stereo or high sample rates
+        audio = audio.set_channels(1).set_frame_rate(min(audio.frame_rate, AUDIO_TRANSCODE_SAMPLE_RATE))
+        extension = TRANSCODE_EXTENSION
+        changed = True
+
+    if not changed:
+        return None, extension, True, original_seconds, original_seconds
+
+    export_format, codec = EXPORT_FORMATS.get(extension, ("wav", None))
+    bitrate = AUDIO_TRANSCODE_BITRATE if transcode and extension not in LOSSLESS_EXTENSIONS else None
+    output = io.BytesIO()
+    audio.export(output, format=export_format, codec=codec, bitrate=bitrate)
+    return output.getvalue(), extension, True, original_seconds, len(audio) / 1000.0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=AUDIO_WORKERS)
+    return _executor
+
+
+def enabled() -> bool:
+    return (AUDIO_TRIM_ENABLED or AUDIO_TRANSCODE_ENABLED) and PYDUB_AVAILABLE
+
+
+async def preprocess(data: bytes, extension: str) -> PreprocessResult:
+    """
+    Trim silence from and/or transcode a recording in the worker pool.
+
+    The processed audio is only used when it is smaller than the upload; if
+    decoding fails the original audio is returned unchanged, so the stage can
+    never make a transcription fail.
+
+    Args:
+        data: The encoded recording
+        extension: The file extension matching its format (see sniff_audio_type)
+
+    Returns:
+        The preprocessing result; ``data`` and ``extension`` describe the audio to upload
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        with timings.stage("preprocess"):
+            output, output_extension, has_speech, original_seconds, output_seconds = await loop.run_in_executor(
+                _get_executor(), _process, data, extension, AUDIO_TRIM_ENABLED, AUDIO_TRANSCODE_ENABLED
+            )
+    except Exception as e:
+        stats.failed += 1
+        logger.warning(f"Audio preprocessing failed, uploading original audio: {str(e)}")
+        return PreprocessResult(data, extension, True, 0.0, 0.0, 0)
+
+    stats.processed += 1
+    stats.bytes_in += len(data)
+    if not has_speech:
+        stats.skipped_no_speech += 1
+        stats.seconds_saved += original_seconds
+        logger.info(f"No speech detected in {original_seconds:.1f}s recording, skipping transcription")
+        return PreprocessResult(b"", extension, False, original_seconds, 0.0, len(data))
+
+    if output is None or len(output) >= len(data):
+        stats.bytes_out += len(data)
+        return PreprocessResult(data, extension, True, original_seconds, original_seconds, 0)
+
+    result = PreprocessResult(output, output_extension, True, original_seconds, output_seconds,
+                              len(data) - len(output))
+    if AUDIO_TRANSCODE_ENABLED:
+        stats.transcoded += 1
+    stats.bytes_out += len(output)
+    stats.seconds_saved += result.seconds_saved
+    logger.info(
+        f"Preprocessed audio: {extension} {original_seconds:.1f}s {len(data)} bytes -> "
+        f"{output_extension} {output_seconds:.1f}s {len(output)} bytes"
+    )
+    return result
+
+
+def shutdown():
+    """Stop the worker pool. Called at application shutdown."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def preprocess_stats() -> Dict[str, Any]:
+    return {
+        "enabled": enabled(),
+        "trim_enabled": AUDIO_TRIM_ENABLED,
+        "transcode_enabled": AUDIO_TRANSCODE_ENABLED,
+        "transcode_format": TRANSCODE_EXTENSION.lstrip("."),
+        "processed": stats.processed,
+        "failed": stats.failed,
+        "skipped_no_speech": stats.skipped_no_speech,
+        "transcoded": stats.transcoded,
+        "bytes_in": stats.bytes_in,
+        "bytes_out": stats.bytes_out,
+        "bytes_saved": stats.bytes_in - stats.bytes_out,
+        "seconds_saved": round(stats.seconds_saved, 3),
+    }
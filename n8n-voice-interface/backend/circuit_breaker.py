@@ -0,0 +1,153 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+import httpx
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+N8N_BREAKER_ENABLED = os.getenv("N8N_BREAKER_ENABLED", "true").lower() not in ("0", "false", "no")
+N8N_BREAKER_FAILURES = int(os.getenv("N8N_BREAKER_FAILURES", "3"))  # consecutive failed turns before opening
+N8N_BREAKER_RESET = float(os.getenv("N8N_BREAKER_RESET", "30"))  # seconds open before a trial request
+N8N_BREAKER_MAX_ENTRIES = int(os.getenv("N8N_BREAKER_MAX_ENTRIES", "1000"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one webhook.
+
+    Closed: requests go through and consecutive failures are counted; after
+    ``failure_threshold`` of them the breaker opens. Open: requests are
+    refused without a network attempt. After ``reset_timeout`` seconds the
+    breaker is half-open and lets a single trial request through, whose
+    outcome closes or re-opens it.
+    """
+
+    __slots__ = ("key", "failure_threshold", "reset_timeout", "state", "consecutive_failures",
+                 "opened_at", "probe_in_flight", "successes", "failures", "short_circuited", "last_failure_at")
+
+    def __init__(self, key: str, failure_threshold: int, reset_timeout: float):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.last_failure_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent now; counts refused requests."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            logger.info(f"Circuit for {self.key} half-open, allowing a trial request")
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+
+        self.short_circuited += 1
+        return False
+
+    def record(self, succeeded: Optional[bool]):
+        """
+        Record the outcome of an allowed request.
+
+        Args:
+            succeeded: True or False, or None if the request ended without telling
+                anything about the webhook's health (e.g. it was shed locally)
+        """
+        was_probe = self.probe_in_flight
+        self.probe_in_flight = False
+        if succeeded is None:
+            return
+
+        if succeeded:
+            self.successes += 1
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.key} closed")
+            self.state = CLOSED
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_failure_at = time.time()
+        if was_probe or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(
+                    f"Circuit for {self.key} open after {self.consecutive_failures} failures, "
+                    f"retrying in {self.reset_timeout}s"
+                )
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def as_dict(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0), 3)
+        return {
+            "webhook": self.key,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": retry_in,
+            "successes": self.successes,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "last_failure_at": self.last_failure_at,
+        }
+
+
+class BreakerRegistry:
+    """Circuit breakers per webhook, keyed by URL without the query string, in LRU order."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_entries: int):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_entries = max_entries
+        self._breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+
+    @staticmethod
+    def key_for(webhook_url: str) -> str:
+        url = httpx.URL(webhook_url)
+        return str(url.copy_with(query=None, fragment=None))
+
+    def get(self, webhook_url: str) -> CircuitBreaker:
+        key = self.key_for(webhook_url)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key, self.failure_threshold, self.reset_timeout)
+            self._breakers[key] = breaker
+            while len(self._breakers) > self.max_entries:
+                self._breakers.popitem(last=False)
+        else:
+            self._breakers.move_to_end(key)
+        return breaker
+
+    def states(self) -> List[Dict[str, Any]]:
+        return [breaker.as_dict() for breaker in self._breakers.values()]
+
+
+# Shared registry used by webhook.py
+circuit_breakers = BreakerRegistry(N8N_BREAKER_FAILURES, N8N_BREAKER_RESET, N8N_BREAKER_MAX_ENTRIES)
+
+
+def breaker_stats() -> Dict[str, Any]:
+    return {
+        "enabled": N8N_BREAKER_ENABLED,
+        "failure_threshold": N8N_BREAKER_FAILURES,
+        "reset_timeout_seconds": N8N_BREAKER_RESET,
+        "breakers": circuit_breakers.states(),
+    }
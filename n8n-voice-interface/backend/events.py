@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "50"))  # events kept per session for resuming
+EVENTS_CLIENT_QUEUE = int(os.getenv("EVENTS_CLIENT_QUEUE", "32"))  # undelivered events per connection
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+EVENTS_MAX_CHANNELS = int(os.getenv("EVENTS_MAX_CHANNELS", "1000"))
+EVENTS_RETRY_MS = 2000
+
+
+class Event:
+    """One server-sent event; ids increase per session."""
+
+    __slots__ = ("event_id", "type", "data", "created_at")
+
+    def __init__(self, event_id: int, event_type: str, data: Dict[str, Any]):
+        self.event_id = event_id
+        self.type = event_type
+        self.data = data
+        self.created_at = time.time()
+
+    def encode(self) -> str:
+        payload = json.dumps({**self.data, "type": self.type, "created_at": self.created_at}, ensure_ascii=False)
+        return f"id: {self.event_id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscriber:
+    """
+    One open event stream.
+
+    Its queue is bounded: a client that falls ``EVENTS_CLIENT_QUEUE`` events
+    behind is disconnected instead of buffering without limit. Browsers
+    reconnect on their own and resume from the session's buffer.
+    """
+
+    __slots__ = ("queue", "overflowed")
+
+    def __init__(self, max_queue: int):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(max_queue + 1)
+        self.overflowed = False
+
+    def offer(self, event: Event):
+        if self.overflowed:
+            return
+        # One slot is kept free for the end-of-stream marker
+        if self.queue.qsize() >= self.queue.maxsize - 1:
+            self.overflowed = True
+            self.queue.put_nowait(None)
+        else:
+            self.queue.put_nowait(event)
+
+
+class EventChannel:
+    """Recent events of one session and the connections following them."""
+
+    __slots__ = ("last_id", "buffer", "subscribers")
+
+    def __init__(self, buffer_size: int):
+        self.last_id = 0
+        self.buffer: "deque[Event]" = deque(maxlen=buffer_size)
+        self.subscribers: List[Subscriber] = []
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        self.last_id += 1
+        event = Event(self.last_id, event_type, data)
+        self.buffer.append(event)
+        for subscriber in self.subscribers:
+            subscriber.offer(event)
+        return event
+
+    def since(self, last_event_id: Optional[int]) -> Optional[List[Event]]:
+        """
+        Return the buffered events after ``last_event_id``.
+
+        Returns None if the client missed events that are no longer buffered
+        (or its id is from before a restart), so it has to resynchronize.
+        """
+        if last_event_id is None:
+            return []
+        if last_event_id > self.last_id:
+            return None
+        missed = [event for event in self.buffer if event.event_id > last_event_id]
+        if len(missed) < self.last_id - last_event_id:
+            return None
+        return missed
+
+
+class EventHub:
+    """
+    Per-session event channels for Server-Sent Events.
+
+    Channels are created on the first event or subscription and kept in LRU
+    order; beyond ``max_channels`` the least recently used channel without
+    open connections is dropped. All operations run on the event loop.
+    """
+
+    def __init__(self, buffer_size: int, client_queue: int, max_channels: int):
+        self.buffer_size = buffer_size
+        self.client_queue = client_queue
+        self.max_channels = max_channels
+        self._channels: "OrderedDict[str, EventChannel]" = OrderedDict()
+        self.published = 0
+        self.overflows = 0
+        self.resyncs = 0
+
+    def _channel(self, session_id: str) -> EventChannel:
+        channel = self._channels.get(session_id)
+        if channel is None:
+            channel = EventChannel(self.buffer_size)
+            self._channels[session_id] = channel
+            self._trim()
+        else:
+            self._channels.move_to_end(session_id)
+        return channel
+
+    def _trim(self):
+        if len(self._channels) <= self.max_channels:
+            return
+        for session_id in list(self._channels):
+            if len(self._channels) <= self.max_channels:
+                break
+            if not self._channels[session_id].subscribers:
+                del self._channels[session_id]
+
+    def publish(self, session_id: str, event_type: str, data: Dict[str, Any]) -> Event:
+        """
+        Send an event to every connection of a session and buffer it for resuming.
+
+        Args:
+            session_id: The session the event belongs to
+            event_type: SSE event name, e.g. "transcription"
+            data: JSON-serializable event fields
+
+        Returns:
+            The published event
+        """
+        self.published += 1
+        return self._channel(session_id).publish(event_type, data)
+
+    async def stream(self, session_id: str, last_event_id: Optional[int],
+                     heartbeat: float = EVENTS_HEARTBEAT) -> AsyncIterator[str]:
+        """
+        Yield the session's events in the text/event-stream format.
+
+        Missed events after ``last_event_id`` are replayed first. If some are
+        no longer buffered a ``resync`` event is sent instead, telling the
+        client to fetch the current state. Comment lines are sent as
+        heartbeats while idle.
+        """
+        channel = self._channel(session_id)
+        subscriber = Subscriber(self.client_queue)
+        # Registered in the same step as the replay is taken, so nothing is lost or sent twice
+        channel.subscribers.append(subscriber)
+        replay = channel.since(last_event_id)
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            if replay is None:
+                self.resyncs += 1
+                yield Event(channel.last_id, "resync", {}).encode()
+                replay = []
+            for event in replay:
+                yield event.encode()
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    self.overflows += 1
+                    logger.warning(f"Event stream of session {session_id[:8]} fell behind, closing it")
+                    break
+                yield event.encode()
+        finally:
+            channel.subscribers.remove(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self._channels),
+            "connections": sum(len(channel.subscribers) for channel in self._channels.values()),
+            "published": self.published,
+            "overflows": self.overflows,
+            "resyncs": self.resyncs,
+        }
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+# Module-level hub shared by all endpoints
+event_hub = EventHub(EVENTS_BUFFER_SIZE, EVENTS_CLIENT_QUEUE, EVENTS_MAX_CHANNELS)
+
+# Session whose request is being handled, so code without a session at hand
+# (TTS segments) can report progress to it
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+
+
+def emit(event_type: str, data: Dict[str, Any]):
+    """Publish an event to the session of the current request, if any."""
+    session_id = current_session_id.get()
+    if session_id is not None:
+        event_hub.publish(session_id, event_type, data)
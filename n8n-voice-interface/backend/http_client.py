@@ -0,0 +1,284 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+import weakref
+import ipaddress
+from typing import Optional, Dict, Any, Tuple
+import httpx
+import httpcore
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "32"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", "300"))
+
+
+class PoolStats:
+    """Counters describing connection churn and pool saturation."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self.host_limit_waits = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+        self.in_flight_by_host: Dict[str, int] = {}
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that caches DNS results and counts new TCP connections.
+
+    Connections are opened to the cached IP address; TLS still uses the
+    original host name for SNI and certificate checks, since httpcore passes
+    the origin host to start_tls separately.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float, stats: PoolStats):
+        self._backend = backend
+        self._ttl = ttl
+        self._stats = stats
+        self._cache: Dict[Tuple[str, int], Tuple[str, float]] = {}
+
+    async def _resolve(self, host: str, port: int) -> str:
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+
+        if self._ttl <= 0:
+            return host
+
+        cached = self._cache.get((host, port))
+        if cached and cached[1] > time.monotonic():
+            self._stats.dns_cache_hits += 1
+            return cached[0]
+
+        self._stats.dns_cache_misses += 1
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._cache[(host, port)] = (address, time.monotonic() + self._ttl)
+        return address
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        address = await self._resolve(host, port)
+        try:
+            stream = await self._backend.connect_tcp(
+                address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+            )
+        except Exception:
+            # The cached address may be stale - resolve again next time
+            self._cache.pop((host, port), None)
+            raise
+        self._stats.connections_opened += 1
+        return stream
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """
+    Response stream that gives back the per-host slot once the body is done.
+
+    The slot is freed when the body has been read to the end, when the stream
+    is closed, or - for responses that are dropped without either - when the
+    stream object is garbage collected.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+        weakref.finalize(self, release)
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+        self._release()
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """
+    Keep-alive transport with a per-host connection cap and pool statistics.
+    """
+
+    def __init__(self, stats: PoolStats, max_per_host: int, dns_ttl: float, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+        self._max_per_host = max_per_host
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+        # httpcore does not expose the backend through httpx, so wrap it in place
+        backend = getattr(self._pool, "_network_backend", None)
+        if backend is not None:
+            self._pool._network_backend = CachingNetworkBackend(backend, dns_ttl, stats)
+        else:
+            logger.warning("Could not install DNS caching backend; using default resolver")
+
+    def pool_snapshot(self) -> Dict[str, int]:
+        connections = list(getattr(self._pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self._max_per_host)
+
+        if limit.locked():
+            self.stats.host_limit_waits += 1
+        # Waiting for a per-host slot counts against the pool timeout, the
+        # same as waiting for a connection inside httpcore
+        pool_timeout = request.extensions.get("timeout", {}).get("pool")
+        try:
+            await asyncio.wait_for(limit.acquire(), timeout=pool_timeout)
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout(
+                f"Timed out waiting for a connection slot to {host}", request=request
+            ) from None
+
+        stats = self.stats
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        stats.in_flight_by_host[host] = stats.in_flight_by_host.get(host, 0) + 1
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            stats.in_flight -= 1
+            stats.in_flight_by_host[host] -= 1
+            limit.release()
+
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[PooledTransport] = None
+_http2 = False
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+
+
+def _create_client() -> httpx.AsyncClient:
+    global _transport, _http2
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    http2 = _http2 = _http2_available()
+    _transport = PooledTransport(
+        PoolStats(),
+        max_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+        dns_ttl=DNS_CACHE_TTL,
+        limits=limits,
+        http2=http2,
+    )
+    logger.info(
+        f"Created shared HTTP client (max_connections={HTTP_MAX_CONNECTIONS}, "
+        f"keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS}, per_host={HTTP_MAX_CONNECTIONS_PER_HOST}, http2={http2})"
+    )
+    return httpx.AsyncClient(transport=_transport, timeout=httpx.Timeout(30.0))
+
+
+async def start_client():
+    """Create the shared HTTP client. Called at application startup."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+
+
+async def close_client():
+    """Close the shared HTTP client and its pooled connections. Called at shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Closed shared HTTP client")
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared HTTP client used for STT, TTS and n8n calls.
+
+    The client is normally created by the application lifespan; it is created
+    lazily here so the modules also work outside of the FastAPI app.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Return connection reuse and saturation statistics for the shared client."""
+    if _transport is None:
+        return {"started": False}
+
+    stats = _transport.stats
+    reused = max(stats.requests - stats.connections_opened, 0)
+    return {
+        "started": _client is not None and not _client.is_closed,
+        "http2": _http2,
+        "requests": stats.requests,
+        "connections_opened": stats.connections_opened,
+        "connections_reused": reused,
+        "reuse_ratio": round(reused / stats.requests, 4) if stats.requests else 0.0,
+        "in_flight": stats.in_flight,
+        "peak_in_flight": stats.peak_in_flight,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "saturation": round(stats.in_flight / HTTP_MAX_CONNECTIONS, 4) if HTTP_MAX_CONNECTIONS else 0.0,
+        "max_connections_per_host": HTTP_MAX_CONNECTIONS_PER_HOST,
+        "host_limit_waits": stats.host_limit_waits,
+        "in_flight_by_host": {host: count for host, count in stats.in_flight_by_host.items() if count},
+        "dns_cache_hits": stats.dns_cache_hits,
+        "dns_cache_misses": stats.dns_cache_misses,
+        "pool": _transport.pool_snapshot(),
+    }
@@ -0,0 +1,127 @@
+from bisect import bisect_left
+from typing import Optional, Dict, List, Tuple
+
+# Constants
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0)
+BYTES_BUCKETS = (
+    4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 512 * 1024,
+    1024 * 1024, 2 * 1024 * 1024, 4 * 1024 * 1024, 8 * 1024 * 1024, 16 * 1024 * 1024, 32 * 1024 * 1024,
+)
+
+# Metrics are only updated from the event loop, so plain ints and floats are
+# enough: no locks, and an observation allocates nothing beyond the float itself.
+_registry: List["_Metric"] = []
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        _registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _LabeledValue(_Metric):
+    """A value per label value (at most one label), or a single value without a label."""
+
+    def __init__(self, name: str, documentation: str, label: Optional[str] = None,
+                 label_values: Tuple[str, ...] = ()):
+        super().__init__(name, documentation)
+        self.label = label
+        # Known label values are created up front so they are exported as 0 before the first event
+        self._values: Dict[Optional[str], float] = {value: 0 for value in label_values} if label else {None: 0}
+
+    def _add(self, amount: float, label_value: Optional[str]):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for label_value, value in self._values.items():
+            if label_value is None:
+                lines.append(f"{self.name} {_format_value(value)}")
+            else:
+                lines.append(f'{self.name}{{{self.label}="{label_value}"}} {_format_value(value)}')
+        return lines
+
+
+class Counter(_LabeledValue):
+    kind = "counter"
+
+    def inc(self, label_value: Optional[str] = None, amount: float = 1):
+        self._add(amount, label_value)
+
+
+class Gauge(_LabeledValue):
+    kind = "gauge"
+
+    def inc(self, label_value: Optional[str] = None, amount: float = 1):
+        self._add(amount, label_value)
+
+    def dec(self, label_value: Optional[str] = None, amount: float = 1):
+        self._add(-amount, label_value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...]):
+        super().__init__(name, documentation)
+        self._bounds = tuple(sorted(buckets))
+        # One slot per bucket plus the +Inf overflow; made cumulative when rendered
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        cumulative = 0
+        for bound, count in zip(self._bounds + (float("inf"),), self._counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(self._sum)}")
+        lines.append(f"{self.name}_count {self._count}")
+        return lines
+
+
+STAGES = ("upload", "stt", "n8n", "tts", "turn")
+
+upload_bytes = Histogram("voice_upload_bytes", "Size of uploaded recordings in bytes.", BYTES_BUCKETS)
+stt_seconds = Histogram("voice_stt_seconds", "Duration of transcription requests to the STT provider.",
+                        LATENCY_BUCKETS)
+n8n_seconds = Histogram("voice_n8n_seconds", "Duration of n8n webhook calls, including retries.", LATENCY_BUCKETS)
+tts_seconds = Histogram("voice_tts_seconds", "Duration of TTS requests until the full audio was received.",
+                        LATENCY_BUCKETS)
+tts_first_byte_seconds = Histogram("voice_tts_first_byte_seconds",
+                                   "Time until streaming TTS responses started.", LATENCY_BUCKETS)
+tts_bytes = Histogram("voice_tts_bytes", "Size of synthesized audio in bytes.", BYTES_BUCKETS)
+turn_seconds = Histogram("voice_turn_seconds", "End-to-end duration of voice turns.", LATENCY_BUCKETS)
+errors = Counter("voice_errors_total", "Failed operations by pipeline stage.", "stage", STAGES)
+in_flight = Gauge("voice_in_flight", "Operations currently in progress by pipeline stage.", "stage", STAGES[1:])
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,130 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from events import event_hub
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+N8N_MODE = os.getenv("N8N_MODE", "sync").lower()  # default for turns that don't choose with the n8n_mode field
+N8N_CALLBACK_TIMEOUT = float(os.getenv("N8N_CALLBACK_TIMEOUT", "120"))
+N8N_CALLBACK_BASE_URL = os.getenv("N8N_CALLBACK_BASE_URL", "")  # public URL of this server, as n8n reaches it
+PENDING_TURNS_MAX = int(os.getenv("PENDING_TURNS_MAX", "1000"))
+
+N8N_MODES = ("sync", "async")
+
+
+class PendingTurn:
+    """A turn handed to n8n in async mode, waiting for its callback."""
+
+    __slots__ = ("correlation_id", "session_id", "webhook_url", "transcription", "created_at", "_timer")
+
+    def __init__(self, session_id: str, webhook_url: str, transcription: str):
+        # Unguessable, so only the workflow that received it can answer the turn
+        self.correlation_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.webhook_url = webhook_url
+        self.transcription = transcription
+        self.created_at = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class PendingTurns:
+    """
+    Bounded table of turns waiting for an n8n callback, keyed by correlation id.
+
+    A turn is removed when its callback arrives, when it has waited
+    ``timeout`` seconds, or when the table is full and it is the oldest; the
+    session is told about the last two with an ``error`` event. All
+    operations run on the event loop.
+    """
+
+    def __init__(self, timeout: float, max_turns: int):
+        self.timeout = timeout
+        self.max_turns = max_turns
+        self._turns: "OrderedDict[str, PendingTurn]" = OrderedDict()
+        self.registered = 0
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.unknown = 0
+
+    def add(self, session_id: str, webhook_url: str, transcription: str) -> PendingTurn:
+        """
+        Register a turn and start its timeout.
+
+        Args:
+            session_id: The session waiting for the reply
+            webhook_url: The webhook the turn was sent to
+            transcription: What the user said
+
+        Returns:
+            The pending turn, whose correlation id goes into the n8n payload
+        """
+        while len(self._turns) >= self.max_turns:
+            _, oldest = self._turns.popitem(last=False)
+            self.evicted += 1
+            self._abandon(oldest, "Too many turns waiting for n8n, this one was dropped")
+
+        turn = PendingTurn(session_id, webhook_url, transcription)
+        turn._timer = asyncio.get_running_loop().call_later(self.timeout, self._expire, turn.correlation_id)
+        self._turns[turn.correlation_id] = turn
+        self.registered += 1
+        return turn
+
+    def complete(self, correlation_id: str) -> Optional[PendingTurn]:
+        """Remove and return the turn a callback answers, or None if it is unknown or timed out."""
+        turn = self._turns.pop(correlation_id, None)
+        if turn is None:
+            self.unknown += 1
+            return None
+        turn._timer.cancel()
+        self.completed += 1
+        return turn
+
+    def discard(self, correlation_id: str):
+        """Forget a turn that was answered without a callback (n8n unreachable or failing)."""
+        turn = self._turns.pop(correlation_id, None)
+        if turn is not None:
+            turn._timer.cancel()
+
+    def _expire(self, correlation_id: str):
+        turn = self._turns.pop(correlation_id, None)
+        if turn is not None:
+            self.expired += 1
+            self._abandon(turn, f"n8n did not answer within {self.timeout:g} seconds")
+
+    def _abandon(self, turn: PendingTurn, detail: str):
+        if turn._timer is not None:
+            turn._timer.cancel()
+        logger.warning(f"Pending turn {turn.correlation_id[:8]} abandoned: {detail}")
+        event_hub.publish(turn.session_id, "error", {
+            "stage": "n8n",
+            "detail": detail,
+            "correlation_id": turn.correlation_id
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._turns),
+            "oldest_seconds": round(next(iter(self._turns.values())).age(), 3) if self._turns else 0.0,
+            "registered": self.registered,
+            "completed": self.completed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "unknown_callbacks": self.unknown,
+            "timeout_seconds": self.timeout,
+            "max_turns": self.max_turns,
+        }
+
+
+# Module-level table shared by the transcribe and webhook endpoints
+pending_turns = PendingTurns(N8N_CALLBACK_TIMEOUT, PENDING_TURNS_MAX)
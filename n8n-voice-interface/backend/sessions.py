@@ -0,0 +1,153 @@
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+SESSION_COOKIE = "voice_session"
+SESSION_HEADER = "x-session-id"
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))  # seconds of inactivity
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(16 * 1024 * 1024)))
+SESSION_ID_MAX_LENGTH = 128
+
+
+class Session:
+    """Conversation state for one client."""
+
+    __slots__ = ("session_id", "created_at", "last_seen", "last_n8n_response", "last_tts_file_path")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+        self.last_n8n_response: Optional[Dict[str, Any]] = None
+        self.last_tts_file_path: Optional[str] = None
+
+    def estimated_bytes(self) -> int:
+        """Rough memory footprint, used for the store's byte budget."""
+        size = 256 + len(self.session_id)
+        if self.last_n8n_response:
+            size += sum(len(str(value)) for value in self.last_n8n_response.values())
+        if self.last_tts_file_path:
+            size += len(self.last_tts_file_path)
+        return size
+
+
+class SessionStore:
+    """
+    In-process store of per-client conversation state.
+
+    Sessions are kept in LRU order. A session expires after ``ttl`` seconds
+    without activity; when the store holds more than ``max_sessions`` or its
+    estimated size exceeds ``max_bytes``, the least recently used sessions are
+    evicted. All operations are O(1) amortized and run on the event loop, so
+    no locking is needed.
+    """
+
+    def __init__(self, ttl: float, max_sessions: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._total_bytes -= self._sizes.pop(session_id, 0)
+
+    def _purge(self):
+        """Drop expired sessions, then the least recently used ones over budget."""
+        now = time.monotonic()
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_seen <= self.ttl:
+                break
+            self._drop(oldest_id)
+            self.expired += 1
+
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ):
+            oldest_id = next(iter(self._sessions))
+            self._drop(oldest_id)
+            self.evicted += 1
+
+    def get(self, session_id: str) -> Session:
+        """
+        Return the session for an id, creating it if needed, and mark it as active.
+
+        Args:
+            session_id: The client's session id
+
+        Returns:
+            The session state
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(session_id)
+            self._sessions[session_id] = session
+            self._sizes[session_id] = session.estimated_bytes()
+            self._total_bytes += self._sizes[session_id]
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_seen = time.monotonic()
+        self._purge()
+        return session
+
+    def peek(self, session_id: str) -> Optional[Session]:
+        """Return a live session without creating it or touching its LRU position."""
+        session = self._sessions.get(session_id)
+        if session is None or time.monotonic() - session.last_seen > self.ttl:
+            return None
+        return session
+
+    def update(self, session: Session, n8n_response: Optional[Dict[str, Any]] = None,
+               tts_file_path: Optional[str] = None):
+        """
+        Record the latest n8n response and/or TTS file for a session.
+        """
+        if n8n_response is not None:
+            session.last_n8n_response = n8n_response
+        if tts_file_path is not None:
+            session.last_tts_file_path = tts_file_path
+
+        # The session may have been evicted while a background task was running
+        if self._sessions.get(session.session_id) is not session:
+            return
+
+        size = session.estimated_bytes()
+        self._total_bytes += size - self._sizes.get(session.session_id, 0)
+        self._sizes[session.session_id] = size
+        self._purge()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "estimated_bytes": self._total_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id: Optional[str]) -> bool:
+    return bool(session_id) and len(session_id) <= SESSION_ID_MAX_LENGTH and session_id.isprintable()
+
+
+# Shared store used by app.py
+session_store = SessionStore(SESSION_TTL, SESSION_MAX_COUNT, SESSION_MAX_BYTES)
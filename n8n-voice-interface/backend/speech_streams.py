@@ -0,0 +1,87 @@
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+STREAM_URL_MAX_CHARS = int(os.getenv("STREAM_URL_MAX_CHARS", "1500"))  # longer texts are synthesized up front
+SPEECH_STREAM_TTL = float(os.getenv("SPEECH_STREAM_TTL", "600"))
+SPEECH_STREAMS_MAX = int(os.getenv("SPEECH_STREAMS_MAX", "1000"))
+
+
+class SpeechStreams:
+    """
+    Texts waiting to be streamed as speech, keyed by an opaque stream id.
+
+    ``POST /api/speak/stream`` registers the text and hands out
+    ``/api/speak/stream/{stream_id}``, which an ``<audio>`` element can GET.
+    The text never appears in a URL, and only the session that registered it
+    can fetch its audio. A stream id can be fetched again (seeking, replays)
+    until it is ``ttl`` seconds old; beyond ``max_streams`` the oldest are
+    dropped. All operations run on the event loop.
+    """
+
+    def __init__(self, ttl: float, max_streams: int):
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self.created = 0
+        self.fetched = 0
+        self.expired = 0
+        self.unknown = 0
+
+    def create(self, text: str, session_id: str) -> str:
+        """Register a text for the session and return its stream id."""
+        self._prune()
+        while len(self._streams) >= self.max_streams:
+            self._streams.popitem(last=False)
+            self.expired += 1
+
+        stream_id = uuid.uuid4().hex
+        self._streams[stream_id] = (text, session_id, time.monotonic() + self.ttl)
+        self.created += 1
+        return stream_id
+
+    def get(self, stream_id: str, session_id: str) -> Optional[str]:
+        """Return the text of a stream registered by the session, or None."""
+        self._prune()
+        entry = self._streams.get(stream_id)
+        if entry is None or entry[1] != session_id:
+            self.unknown += 1
+            return None
+        self.fetched += 1
+        return entry[0]
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._streams:
+            stream_id, (_, _, expires_at) = next(iter(self._streams.items()))
+            if expires_at > now:
+                break
+            del self._streams[stream_id]
+            self.expired += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self._streams),
+            "created": self.created,
+            "fetched": self.fetched,
+            "expired": self.expired,
+            "unknown": self.unknown,
+            "ttl_seconds": self.ttl,
+            "max_streams": self.max_streams,
+            "max_chars": STREAM_URL_MAX_CHARS,
+        }
+
+
+def stream_url(stream_id: str) -> str:
+    return f"/api/speak/stream/{stream_id}"
+
+
+# Module-level registry used by the speech endpoints
+speech_streams = SpeechStreams(SPEECH_STREAM_TTL, SPEECH_STREAMS_MAX)
@@ -1,9 +1,18 @@
 import os
+import time
+import asyncio
 import logging
 import uuid
-import tempfile
-import requests
+import httpx
+from typing import AsyncIterator, Optional
 from fastapi import UploadFile, HTTPException
+from http_client import get_client
+from admission import stt_limiter
+from stt_cache import stt_cache, AudioFingerprint
+import metrics
+import timings
+import audio_preprocess
+from audio_preprocess import sniff_audio_type
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,104 +20,201 @@ logger = logging.getLogger(__name__)
 
 # Constants
 STT_MODEL = os.getenv("STT_MODEL", "gpt-4o-transcribe")  # Updated to use gpt-4o-transcribe as default
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "pl")  # Force Polish language recognition by default
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-API_URL = "https://api.openai.com/v1/audio/transcriptions"
+API_URL = os.getenv("STT_API_URL", "https://api.openai.com/v1/audio/transcriptions")
+
+# Timeouts (seconds) for the transcription request
+STT_CONNECT_TIMEOUT = float(os.getenv("STT_CONNECT_TIMEOUT", "5"))
+STT_WRITE_TIMEOUT = float(os.getenv("STT_WRITE_TIMEOUT", "30"))
+STT_READ_TIMEOUT = float(os.getenv("STT_READ_TIMEOUT", "60"))
+STT_POOL_TIMEOUT = float(os.getenv("STT_POOL_TIMEOUT", "10"))
+STT_TOTAL_TIMEOUT = float(os.getenv("STT_TOTAL_TIMEOUT", "90"))
+
+STT_TIMEOUT = httpx.Timeout(
+    connect=STT_CONNECT_TIMEOUT,
+    write=STT_WRITE_TIMEOUT,
+    read=STT_READ_TIMEOUT,
+    pool=STT_POOL_TIMEOUT
+)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 
 async def transcribe_audio(audio_file: UploadFile) -> dict:
     """
-    Transcribe audio using OpenAI's API.
-    
+    Transcribe an uploaded file using OpenAI's API.
+
+    The file is forwarded in chunks, never read into memory as a whole.
+
     Args:
         audio_file: The uploaded audio file
-    
+
+    Returns:
+        A dictionary containing the transcription text
+    """
+    async def read_chunks():
+        while True:
+            chunk = await audio_file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    return await transcribe_stream(
+        read_chunks(),
+        content_type=audio_file.content_type,
+        filename=audio_file.filename,
+        size=audio_file.size
+    )
+
+async def transcribe_stream(
+    chunks: AsyncIterator[bytes],
+    content_type: Optional[str],
+    filename: Optional[str] = None,
+    size: Optional[int] = None
+) -> dict:
+    """
+    Transcribe audio using OpenAI's API.
+
+    With the transcription cache enabled (or preprocessing on), the recording
+    is received and hashed first. If it is in the cache (a client retrying a
+    turn), its transcription is returned without calling the provider; if an
+    identical recording is being transcribed right now, that result is
+    shared. Only on a miss is the provider request opened, with a known
+    Content-Length. Without the cache, the multipart body is assembled on the
+    fly, so audio chunks go straight from the source iterator to the provider.
+    The request does not block the event loop, so a slow transcription does
+    not stall other requests.
+
+    Args:
+        chunks: Async iterator yielding the audio bytes
+        content_type: The content type of the audio
+        filename: The original filename, for logging
+        size: The audio size in bytes if known (enables a Content-Length header)
+
     Returns:
         A dictionary containing the transcription text
     """
     if not OPENAI_API_KEY:
         logger.error("OpenAI API key not found in environment")
         raise HTTPException(
-            status_code=500, 
+            status_code=500,
             detail="OPENAI_API_KEY environment variable not set"
         )
     logger.info("OpenAI API key found in environment")
 
-    temp_file_path = None
-    
+    fingerprint = AudioFingerprint() if stt_cache is not None else None
+    # Set while this request is the one transcribing its recording
+    job: Optional["asyncio.Future[dict]"] = None
     try:
-        # Get content type from the uploaded file
-        content_type = audio_file.content_type
-        logger.info(f"File from request: {audio_file.filename}, content-type: {content_type}")
-
-        # Extract base content type without codecs info
-        base_content_type = content_type.split(';')[0].strip()
-        
-        # Extract file extension from content type
-        file_extension = ".mp3"  # Default
-        if "webm" in base_content_type:
-            file_extension = ".webm"
-        elif "wav" in base_content_type or "wave" in base_content_type:
-            file_extension = ".wav"
-        elif "ogg" in base_content_type:
-            file_extension = ".ogg"
-        elif "mp4" in base_content_type or "m4a" in base_content_type:
-            file_extension = ".m4a"
-            
-        logger.info(f"Using file extension: {file_extension} for content type: {base_content_type}")
-
-        # Save the uploaded file to a temporary location with correct extension
-        temp_dir = tempfile.gettempdir()
-        temp_file_name = f"{uuid.uuid4()}{file_extension}"
-        temp_file_path = os.path.join(temp_dir, temp_file_name)
-
-        with open(temp_file_path, "wb") as temp_file:
-            # Read the file in chunks
-            content = await audio_file.read()
-            temp_file.write(content)
-
-        logger.info(f"Saved audio to temporary file: {temp_file_path}")
+        logger.info(f"File from request: {filename}, content-type: {content_type}")
+        # Identify the format from the first bytes of the recording
+        source = chunks.__aiter__()
+        try:
+            first_chunk = await source.__anext__()
+        except StopAsyncIteration:
+            first_chunk = b""
+        file_extension, mime_type_for_api = sniff_audio_type(first_chunk, content_type)
+        if not first_chunk:
+            raise HTTPException(status_code=400, detail="Empty recording")
+        received = len(first_chunk)
+
+        # The cache lookup and preprocessing need the whole recording before the provider is called
+        if fingerprint is not None or audio_preprocess.enabled():
+            audio_chunks = [first_chunk]
+            if fingerprint is not None:
+                fingerprint.update(first_chunk)
+            async for chunk in source:
+                audio_chunks.append(chunk)
+                received += len(chunk)
+                if fingerprint is not None:
+                    fingerprint.update(chunk)
+            source = None
+            first_chunk = b"".join(audio_chunks)
+            size = received
+
+            if fingerprint is not None:
+                key = fingerprint.key(STT_MODEL, STT_LANGUAGE)
+                cached = stt_cache.get(key)
+                if cached is not None:
+                    logger.info(f"Transcription cache hit: {key[:12]}")
+                    return cached
+                running = stt_cache.running(key)
+                if running is not None:
+                    logger.info(f"Joining in-flight transcription {key[:12]}")
+                    return await stt_cache.join(running)
+                job = stt_cache.claim(key)
+
+        # Optionally trim silence and/or transcode first
+        if audio_preprocess.enabled():
+            preprocessed = await audio_preprocess.preprocess(first_chunk, file_extension)
+            if not preprocessed.has_speech:
+                raise HTTPException(status_code=422, detail="No speech detected")
+            first_chunk = preprocessed.data
+            file_extension, mime_type_for_api = preprocessed.extension, preprocessed.mime_type
+            size = len(first_chunk)
+            source = None
+
+        logger.info(f"Using file extension {file_extension} and MIME type {mime_type_for_api} for API request")
+
+        # Build the multipart body around the file
+        boundary = uuid.uuid4().hex
+        preamble = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="model"\r\n\r\n{STT_MODEL}\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="language"\r\n\r\n{STT_LANGUAGE}\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{uuid.uuid4()}{file_extension}"\r\n'
+            f'Content-Type: {mime_type_for_api}\r\n\r\n'
+        ).encode("utf-8")
+        epilogue = f'\r\n--{boundary}--\r\n'.encode("utf-8")
+
+        # Taken once the recording is complete: the slot covers the provider's
+        # work, not the time the user spends talking or uploading
+        slot = None
+        started = None
+
+        async def multipart_body():
+            nonlocal received, slot, started
+            yield preamble
+            yield first_chunk
+            if source is not None:
+                async for chunk in source:
+                    received += len(chunk)
+                    yield chunk
+            slot = await stt_limiter.acquire()
+            started = time.perf_counter()
+            metrics.in_flight.inc("stt")
+            yield epilogue
 
         # Set up the request headers
         headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}"
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": f"multipart/form-data; boundary={boundary}"
         }
+        if size is not None:
+            headers["Content-Length"] = str(len(preamble) + size + len(epilogue))
 
-        # Prepare the file and form data
-        with open(temp_file_path, "rb") as file:
-            # Simplify MIME type for OpenAI API - remove codec information
-            mime_type_for_api = base_content_type
-            
-            # Force specific formats that we know work well
-            if "webm" in mime_type_for_api:
-                # OpenAI docs mention support for webm
-                mime_type_for_api = "audio/webm"
-            elif "wav" in mime_type_for_api or "wave" in mime_type_for_api:
-                mime_type_for_api = "audio/wav"
-            elif "mp3" in mime_type_for_api or "mpeg" in mime_type_for_api:
-                mime_type_for_api = "audio/mp3"
-            
-            logger.info(f"Using MIME type for API request: {mime_type_for_api}")
-            
-            files = {
-                "file": (os.path.basename(temp_file_path), file, mime_type_for_api),
-                "model": (None, STT_MODEL),
-                "language": (None, "pl")  # Force Polish language recognition
-            }
-            
-            # Make the API request
-            logger.info(f"Sending request to OpenAI API using model: {STT_MODEL}")
-            response = requests.post(
-                API_URL,
-                headers=headers,
-                files=files
-            )
-
-        # Clean up temporary file
+        # Make the API request
+        logger.info(f"Sending request to OpenAI API using model: {STT_MODEL}")
+        client = get_client()
         try:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                logger.info(f"Removed temporary file: {temp_file_path}")
-        except Exception as e:
-            logger.warning(f"Failed to remove temporary file: {str(e)}")
+            response = await asyncio.wait_for(
+                client.post(
+                    API_URL,
+                    headers=headers,
+                    content=multipart_body(),
+                    timeout=STT_TIMEOUT
+                ),
+                timeout=STT_TOTAL_TIMEOUT
+            )
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            logger.error(f"Transcription request timed out: {type(e).__name__}")
+            raise HTTPException(status_code=504, detail="Transcription timed out")
+        finally:
+            if slot is not None:
+                slot.release()
+                metrics.in_flight.dec("stt")
+                metrics.stt_seconds.observe(time.perf_counter() - started)
+                timings.record("stt", started)
+        metrics.upload_bytes.observe(received)
 
         # Check for errors
         if response.status_code != 200:
@@ -129,11 +235,28 @@ async def transcribe_audio(audio_file: UploadFile) -> dict:
         result = response.json()
         logger.info(f"Transcription successful: {result.get('text', '')[:50]}...")
 
+        if job is not None:
+            job.set_result(result)
         return result
 
     except Exception as e:
         if isinstance(e, HTTPException):
+            # A recording without speech is an answer, not a failure
+            if e.status_code != 422:
+                metrics.errors.inc("stt")
+            error = e
+        else:
+            metrics.errors.inc("stt")
+            logger.error(f"Error during transcription: {str(e)}", exc_info=True)
+            error = HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
+
+        # Requests waiting for the same recording get the same answer
+        if job is not None and not job.done():
+            job.set_exception(error)
+        if error is e:
             raise
+        raise error
 
-        logger.error(f"Error during transcription: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
+    finally:
+        if job is not None and not job.done():
+            job.set_exception(HTTPException(status_code=500, detail="Transcription interrupted"))
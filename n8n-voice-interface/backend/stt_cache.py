@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+STT_CACHE_ENABLED = os.getenv("STT_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+STT_CACHE_TTL = float(os.getenv("STT_CACHE_TTL", "600"))
+STT_CACHE_MAX_ENTRIES = int(os.getenv("STT_CACHE_MAX_ENTRIES", "500"))
+
+
+class AudioFingerprint:
+    """
+    Content hash of a recording, updated chunk by chunk as the audio passes through.
+    """
+
+    __slots__ = ("_hash", "size")
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def update(self, chunk: bytes):
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def key(self, model: str, language: str) -> str:
+        """
+        Build the cache key of the recording once all of it has been seen.
+
+        Args:
+            model: The STT model used
+            language: The transcription language
+
+        Returns:
+            A hex sha256 digest identifying the transcription
+        """
+        material = json.dumps([self._hash.hexdigest(), self.size, model, language])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """
+    In-memory LRU cache of transcriptions with a time to live.
+
+    Clients retry a failed turn by sending the same recording again; its
+    transcription is then served from here. A recording identical to one
+    that is being transcribed right now waits for that request instead of
+    starting another one. Entries expire after ``ttl`` seconds, and beyond
+    ``max_entries`` the least recently used entries are dropped.
+    All operations run on the event loop.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._running: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored transcription for ``key``, or None if it is unknown or expired."""
+        job = self._running.get(key)
+        if job is not None and job.done():
+            # Finished, but its done callback has not run yet
+            self._finish(key, job)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+            del self._entries[key]
+            self.expired += 1
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl, dict(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def running(self, key: str) -> Optional["asyncio.Future[Dict[str, Any]]"]:
+        job = self._running.get(key)
+        if job is not None and not job.done():
+            return job
+        return None
+
+    def claim(self, key: str) -> "asyncio.Future[Dict[str, Any]]":
+        """
+        Register a transcription of ``key`` in flight.
+
+        The caller resolves the returned future with the result (which also
+        stores it) or an exception; identical recordings wait for it meanwhile.
+        """
+        job = asyncio.get_running_loop().create_future()
+        self._running[key] = job
+        job.add_done_callback(lambda finished: self._finish(key, finished))
+        return job
+
+    def _finish(self, key: str, job: "asyncio.Future[Dict[str, Any]]"):
+        if self._running.get(key) is job:
+            del self._running[key]
+        # Retrieve the exception even if nobody was waiting
+        if not job.cancelled() and job.exception() is None:
+            self.put(key, job.result())
+
+    async def join(self, job: "asyncio.Future[Dict[str, Any]]") -> Dict[str, Any]:
+        """Wait for a transcription in flight; its error is raised here too."""
+        self.joined += 1
+        return dict(await asyncio.shield(job))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "running": len(self._running),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "joined": self.joined,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Shared cache instance used by stt.py
+stt_cache: Optional[TranscriptCache] = TranscriptCache(STT_CACHE_TTL, STT_CACHE_MAX_ENTRIES) if STT_CACHE_ENABLED else None
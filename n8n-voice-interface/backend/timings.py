@@ -0,0 +1,150 @@
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
+
+# Constants
+TIMELINE_BUFFER_SIZE = int(os.getenv("TIMELINE_BUFFER_SIZE", "200"))
+
+# Order in which stages appear in Server-Timing headers and timelines
+STAGE_ORDER = ("upload", "preprocess", "stt", "n8n", "tts", "write")
+
+
+class Timeline:
+    """
+    Per-turn breakdown of where time went.
+
+    Each stage keeps the span from its first start to its last end, plus the
+    time actually spent in it; a stage that runs several times (body reads,
+    TTS segments) is folded into one entry instead of growing a list.
+    """
+
+    __slots__ = ("turn_id", "kind", "started_at", "_origin", "_finished", "_stages", "status")
+
+    def __init__(self, kind: str):
+        self.turn_id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._finished: Optional[float] = None
+        # name -> [first start, last end, busy seconds, count], offsets relative to the turn start
+        self._stages: Dict[str, List[float]] = {}
+        self.status: Optional[int] = None
+
+    def record(self, name: str, start: float, end: float):
+        """Add one run of a stage, given perf_counter() timestamps."""
+        start -= self._origin
+        end -= self._origin
+        stage = self._stages.get(name)
+        if stage is None:
+            self._stages[name] = [start, end, end - start, 1]
+        else:
+            if start < stage[0]:
+                stage[0] = start
+            if end > stage[1]:
+                stage[1] = end
+            stage[2] += end - start
+            stage[3] += 1
+
+    def finish(self, status: Optional[int] = None):
+        self._finished = time.perf_counter() - self._origin
+        self.status = status
+
+    def _ordered(self) -> List[str]:
+        known = [name for name in STAGE_ORDER if name in self._stages]
+        return known + [name for name in self._stages if name not in STAGE_ORDER]
+
+    def durations(self) -> Dict[str, float]:
+        """
+        Return {stage: milliseconds}, plus the total so far.
+
+        A stage's duration is the time spent in it, capped at its span: body
+        reads interleaved with STT count only while waiting for the client, and
+        parallel TTS segments count once.
+        """
+        durations = {}
+        for name in self._ordered():
+            first_start, last_end, busy, _ = self._stages[name]
+            durations[name] = round(min(busy, last_end - first_start) * 1000, 1)
+        total = self._finished if self._finished is not None else time.perf_counter() - self._origin
+        durations["total"] = round(total * 1000, 1)
+        return durations
+
+    def server_timing(self) -> str:
+        """Render the stage durations as a Server-Timing header value, in milliseconds."""
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in self.durations().items())
+
+    def as_dict(self) -> Dict[str, Any]:
+        stages = []
+        for name in self._ordered():
+            first_start, last_end, busy, count = self._stages[name]
+            stages.append({
+                "stage": name,
+                "start_ms": round(first_start * 1000, 1),
+                "duration_ms": round((last_end - first_start) * 1000, 1),
+                "busy_ms": round(busy * 1000, 1),
+                "count": int(count),
+            })
+        return {
+            "turn_id": self.turn_id,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "status": self.status,
+            "total_ms": round(self._finished * 1000, 1) if self._finished is not None else None,
+            "stages": stages,
+        }
+
+
+# Timeline of the turn being handled in the current task (and tasks it starts)
+current_timeline: ContextVar[Optional[Timeline]] = ContextVar("current_timeline", default=None)
+
+# Most recent turns, newest last. Stages that finish after the response (background
+# TTS) still land in their timeline, since the buffer holds the objects themselves.
+recent_timelines: "deque[Timeline]" = deque(maxlen=TIMELINE_BUFFER_SIZE)
+
+
+def begin_turn(kind: str) -> Timeline:
+    """Start a timeline for the current context and add it to the ring buffer."""
+    timeline = Timeline(kind)
+    current_timeline.set(timeline)
+    recent_timelines.append(timeline)
+    return timeline
+
+
+def record(name: str, start: float) -> None:
+    """Record a stage that started at ``start`` (perf_counter) and ends now, if a turn is being timed."""
+    timeline = current_timeline.get()
+    if timeline is not None:
+        timeline.record(name, start, time.perf_counter())
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as a stage of the current turn."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start)
+
+
+def current_durations() -> Dict[str, float]:
+    """Stage durations of the turn being handled so far, or {} if it isn't timed."""
+    timeline = current_timeline.get()
+    return timeline.durations() if timeline is not None else {}
+
+
+def find(turn_id: str) -> Optional[Timeline]:
+    for timeline in reversed(recent_timelines):
+        if timeline.turn_id == turn_id:
+            return timeline
+    return None
+
+
+def recent(limit: int) -> List[Dict[str, Any]]:
+    """Return up to ``limit`` recent timelines, newest first."""
+    timelines = list(recent_timelines)[-limit:] if limit > 0 else []
+    return [timeline.as_dict() for timeline in reversed(timelines)]
@@ -1,10 +1,17 @@
 import os
+import time
 import logging
 import uuid
-import tempfile
 import httpx
 import json
-from typing import Optional
+from typing import Optional, AsyncIterator
+from tts_cache import tts_cache, cache_key
+from artifacts import artifact_registry, ARTIFACT_DIR
+from http_client import get_client
+from admission import tts_limiter, Overloaded, Slot
+from tts_jobs import tts_jobs, StreamJob
+import metrics
+import timings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,53 +19,218 @@ logger = logging.getLogger(__name__)
 
 # Constants
 TTS_MODEL = os.getenv("TTS_MODEL", "gpt-4o-mini-tts")
+TTS_VOICE = os.getenv("TTS_VOICE", "ash")
+TTS_FORMAT = os.getenv("TTS_FORMAT", "mp3")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-API_URL = "https://api.openai.com/v1/audio/speech"
+API_URL = os.getenv("TTS_API_URL", "https://api.openai.com/v1/audio/speech")
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Content types of the formats supported by the speech API
+MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "audio/L16",
+}
+TTS_MEDIA_TYPE = MEDIA_TYPES.get(TTS_FORMAT, "application/octet-stream")
+TTS_TIMEOUT = httpx.Timeout(30.0, read=30.0)
+
+def _speech_request(text: str) -> httpx.Request:
+    """Build the speech API request for a text."""
+    if not OPENAI_API_KEY:
+        logger.error("OpenAI API key not found in environment")
+        raise Exception("OPENAI_API_KEY environment variable not set")
+
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": TTS_MODEL,
+        "voice": TTS_VOICE,
+        "input": text,
+        "response_format": TTS_FORMAT
+    }
+    return get_client().build_request("POST", API_URL, headers=headers, json=payload, timeout=TTS_TIMEOUT)
+
+def _api_error(status_code: int, error_text: str) -> Exception:
+    """Log a failed speech API response and build the exception raised for it."""
+    logger.error(f"OpenAI API error: {status_code} - {error_text}")
+    return Exception(f"TTS failed: {error_text}")
 
 async def text_to_speech(text: str) -> str:
     """
     Convert text to speech using OpenAI's API.
+
+    Identical requests (same text, model, voice and format) are served from
+    the TTS cache without calling the API, or wait for the synthesis already
+    in flight.
     """
-    if not OPENAI_API_KEY:
-        logger.error("OpenAI API key not found in environment")
-        raise Exception("OPENAI_API_KEY environment variable not set")
+    key = cache_key(text, TTS_MODEL, TTS_VOICE, TTS_FORMAT)
+    if tts_cache is not None:
+        cached_file = tts_cache.get(key)
+        if cached_file:
+            logger.info(f"TTS cache hit: {cached_file}")
+            return cached_file
+
+    return await tts_jobs.run(key, lambda: _synthesize(text, key))
+
+async def _synthesize(text: str, key: str) -> str:
+    """Call the speech API and save the audio to the cache (or a file)."""
+    request = _speech_request(text)
 
     try:
         # Create a unique filename for the output
-        temp_dir = tempfile.gettempdir()
-        output_file = os.path.join(temp_dir, f"{uuid.uuid4()}.mp3")
+        output_file = os.path.join(ARTIFACT_DIR, f"{uuid.uuid4()}.{TTS_FORMAT}")
 
-        # Set up headers
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
+        logger.info(f"Making TTS request with model {TTS_MODEL} and voice {TTS_VOICE}")
 
-        # Prepare the request payload
-        payload = {
-            "model": TTS_MODEL,
-            "voice": "ash",
-            "input": text
-        }
+        # Make the API request
+        async with tts_limiter.limit():
+            started = time.perf_counter()
+            metrics.in_flight.inc("tts")
+            try:
+                response = await get_client().send(request)
+            finally:
+                metrics.in_flight.dec("tts")
+                metrics.tts_seconds.observe(time.perf_counter() - started)
+                timings.record("tts", started)
+        if response.status_code != 200:
+            raise _api_error(response.status_code, response.text)
 
-        logger.info(f"Making TTS request with model {TTS_MODEL} and voice ash")
+        metrics.tts_bytes.observe(len(response.content))
 
-        # Make the API request
-        timeout_settings = httpx.Timeout(30.0, read=30.0)
-        async with httpx.AsyncClient(timeout=timeout_settings) as client:
-            response = await client.post(API_URL, headers=headers, json=payload)
-            if response.status_code != 200:
-                error_text = response.text
-                logger.error(f"OpenAI API error: {response.status_code} - {error_text}")
-                raise Exception(f"TTS failed: {error_text}")
-
-            # Save the audio response to a file
-            with open(output_file, 'wb') as f:
-                f.write(response.content)
+        # Save the audio response to the cache, or to a file if caching is off
+        with timings.stage("write"):
+            if tts_cache is not None:
+                output_file = tts_cache.put(key, response.content, TTS_FORMAT)
+            else:
+                with open(output_file, 'wb') as f:
+                    f.write(response.content)
 
         logger.info(f"TTS successful: Output saved to {output_file}")
         return output_file
 
+    except Overloaded:
+        metrics.errors.inc("tts")
+        raise
     except Exception as e:
+        metrics.errors.inc("tts")
         logger.error(f"Error during text-to-speech conversion: {str(e)}", exc_info=True)
-        raise Exception(f"TTS error: {str(e)}")
\ No newline at end of file
+        raise Exception(f"TTS error: {str(e)}")
+
+async def stream_text_to_speech(text: str) -> AsyncIterator[bytes]:
+    """
+    Convert text to speech, yielding audio chunks as they arrive from the API.
+
+    The upstream request is made (and its status checked) before this
+    coroutine returns, so errors surface before any audio is sent to the
+    client. Chunks are written to a file as they pass through; once the
+    stream completes the file is added to the TTS cache. A cache hit streams
+    the cached file without calling the API; if the same audio is already
+    being synthesized, the finished file is streamed once that job is done.
+
+    Returns:
+        An async iterator over the audio bytes
+    """
+    key = cache_key(text, TTS_MODEL, TTS_VOICE, TTS_FORMAT)
+    if tts_cache is not None:
+        cached_file = tts_cache.get(key)
+        if cached_file:
+            logger.info(f"TTS cache hit (stream): {cached_file}")
+            return iter_file(cached_file)
+
+    if tts_jobs.running(key) is not None:
+        return iter_file(await tts_jobs.run(key, lambda: _synthesize(text, key)))
+
+    request = _speech_request(text)
+    logger.info(f"Making streaming TTS request with model {TTS_MODEL} and voice {TTS_VOICE}")
+
+    # Later requests for the same audio wait for this stream to complete
+    job = tts_jobs.claim(key)
+
+    # The slot is held until the audio has been streamed through
+    try:
+        slot = await tts_limiter.acquire()
+    except Overloaded:
+        job.fail()
+        metrics.errors.inc("tts")
+        raise
+    started = time.perf_counter()
+    # Counted until the response starts; the stream itself is bounded by the slot
+    metrics.in_flight.inc("tts")
+    try:
+        try:
+            response = await get_client().send(request, stream=True)
+        finally:
+            metrics.in_flight.dec("tts")
+    except Exception as e:
+        slot.release()
+        job.fail()
+        metrics.errors.inc("tts")
+        logger.error(f"Error during streaming text-to-speech request: {str(e)}", exc_info=True)
+        raise Exception(f"TTS error: {str(e)}")
+
+    if response.status_code != 200:
+        error_text = (await response.aread()).decode("utf-8", errors="replace")
+        await response.aclose()
+        slot.release()
+        job.fail()
+        metrics.errors.inc("tts")
+        raise _api_error(response.status_code, error_text)
+
+    metrics.tts_first_byte_seconds.observe(time.perf_counter() - started)
+    return _tee_response(response, key, slot, job, started)
+
+async def _tee_response(response: httpx.Response, key: str, slot: Slot, job: StreamJob,
+                        started: float) -> AsyncIterator[bytes]:
+    """Yield the response body while writing it to a file for the cache."""
+    if tts_cache is not None:
+        partial_file = tts_cache.partial_path(key, TTS_FORMAT)
+    else:
+        partial_file = os.path.join(ARTIFACT_DIR, f"{uuid.uuid4()}.{TTS_FORMAT}.part")
+
+    completed = False
+    streamed = 0
+    try:
+        with open(partial_file, "wb") as f:
+            async for chunk in response.aiter_bytes():
+                write_started = time.perf_counter()
+                f.write(chunk)
+                timings.record("write", write_started)
+                streamed += len(chunk)
+                yield chunk
+        completed = True
+    finally:
+        await response.aclose()
+        slot.release()
+        timings.record("tts", started)
+        if completed:
+            metrics.tts_seconds.observe(time.perf_counter() - started)
+            metrics.tts_bytes.observe(streamed)
+            if tts_cache is not None:
+                output_file = tts_cache.put_file(key, partial_file, TTS_FORMAT)
+            else:
+                output_file = partial_file[:-len(".part")]
+                os.replace(partial_file, output_file)
+            job.done(output_file)
+            logger.info(f"Streaming TTS complete: Output saved to {output_file}")
+        else:
+            job.fail()
+            # Client went away or upstream failed - don't keep a truncated clip
+            logger.warning("Streaming TTS interrupted, discarding partial audio")
+            try:
+                os.remove(partial_file)
+            except OSError:
+                pass
+
+async def iter_file(path: str) -> AsyncIterator[bytes]:
+    """Yield a file in chunks of STREAM_CHUNK_SIZE; the GC skips it until done."""
+    with artifact_registry.streaming(path), open(path, "rb") as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
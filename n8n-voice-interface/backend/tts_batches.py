@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable, AsyncIterator
+from fastapi import HTTPException
+from tts_segments import segmented_text_to_speech
+import events
+import timings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+TTS_BATCH_MAX_ITEMS = int(os.getenv("TTS_BATCH_MAX_ITEMS", "500"))
+TTS_BATCH_CONCURRENCY = int(os.getenv("TTS_BATCH_CONCURRENCY", "4"))  # TTS requests of all batches, below TTS_MAX_CONCURRENCY
+TTS_BATCH_RETENTION = float(os.getenv("TTS_BATCH_RETENTION", "3600"))  # seconds a finished batch can still be read
+TTS_BATCH_MAX_JOBS = int(os.getenv("TTS_BATCH_MAX_JOBS", "100"))
+
+
+class BatchItem:
+    """One distinct text of a batch, and the request entries it answers."""
+
+    __slots__ = ("text", "indexes", "status", "audio_id", "audio_url", "error")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.indexes: List[int] = []
+        self.status = "pending"
+        self.audio_id: Optional[str] = None
+        self.audio_url: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        item = {"text": self.text, "indexes": self.indexes, "status": self.status}
+        if self.status == "done":
+            item["audio_id"] = self.audio_id
+            item["audio_url"] = self.audio_url
+        elif self.status == "failed":
+            item["error"] = self.error
+        return item
+
+
+class BatchJob:
+    """A batch of texts being pre-rendered, with its items in completion order."""
+
+    def __init__(self, texts: List[str]):
+        self.batch_id = uuid.uuid4().hex
+        self.total = len(texts)
+        self.items: List[BatchItem] = []
+        by_text: Dict[str, BatchItem] = {}
+        for index, text in enumerate(texts):
+            item = by_text.get(text)
+            if item is None:
+                item = by_text[text] = BatchItem(text)
+                self.items.append(item)
+            item.indexes.append(index)
+        self.completed: List[BatchItem] = []
+        self.failed = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def _item_done(self, item: BatchItem):
+        self.completed.append(item)
+        if item.status == "failed":
+            self.failed += 1
+        if len(self.completed) == len(self.items):
+            self.finished_at = time.time()
+        # Wake the progress streams waiting on the current event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "batch_id": self.batch_id,
+            "status": "done" if self.finished else "running",
+            "total": self.total,
+            "unique": len(self.items),
+            "completed": len(self.completed),
+            "failed": self.failed,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.created_at, 3),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.summary(), "items": [item.to_dict() for item in self.items]}
+
+    async def progress(self) -> AsyncIterator[str]:
+        """
+        Yield NDJSON lines: one ``item`` line per distinct text as it finishes
+        (those already finished first), then a ``batch`` summary line.
+        """
+        sent = 0
+        while True:
+            changed = self._changed
+            for item in self.completed[sent:]:
+                yield json.dumps({"type": "item", **item.to_dict()}, ensure_ascii=False) + "\n"
+            sent = len(self.completed)
+            if self.finished:
+                yield json.dumps({"type": "batch", **self.summary()}) + "\n"
+                return
+            await changed.wait()
+
+
+class TTSBatches:
+    """
+    Pre-rendering of many texts into the TTS cache.
+
+    Each batch is synthesized in the background; identical texts within a
+    batch are rendered once, and texts already cached finish immediately.
+    All batches together make at most ``concurrency`` TTS requests at a time,
+    counting every segment of a long text, so real-time turns keep most TTS
+    slots. Finished batches stay readable for ``retention`` seconds; at most
+    ``max_jobs`` batches are kept. Batches need the TTS cache: without it the
+    rendered audio would not be reused. All operations run on the event loop.
+    """
+
+    def __init__(self, concurrency: int, retention: float, max_jobs: int):
+        self.concurrency = concurrency
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        # Shared by the segment requests of all batch items
+        self._requests: Optional[asyncio.Semaphore] = None
+        self.submitted = 0
+        self.rendered = 0
+        self.failed = 0
+
+    def _prune(self):
+        now = time.time()
+        for batch_id, job in list(self._jobs.items()):
+            if job.finished and (now - job.finished_at > self.retention or len(self._jobs) >= self.max_jobs):
+                del self._jobs[batch_id]
+
+    def submit(self, texts: List[str], publish: Callable[[str], str]) -> BatchJob:
+        """
+        Start pre-rendering a batch.
+
+        Args:
+            texts: The texts to synthesize, duplicates allowed
+            publish: Registers a rendered file and returns its audio URL
+
+        Returns:
+            The running batch
+
+        Raises:
+            HTTPException: 429 if ``max_jobs`` batches are still running
+        """
+        self._prune()
+        if len(self._jobs) >= self.max_jobs:
+            raise HTTPException(status_code=429, detail="Too many TTS batches running, try again later")
+        if self._requests is None:
+            self._requests = asyncio.Semaphore(self.concurrency)
+
+        job = BatchJob(texts)
+        self._jobs[job.batch_id] = job
+        self.submitted += 1
+        job._task = asyncio.create_task(self._run(job, publish))
+        logger.info(f"TTS batch {job.batch_id[:8]}: {job.total} texts, {len(job.items)} distinct")
+        return job
+
+    def get(self, batch_id: str) -> Optional[BatchJob]:
+        return self._jobs.get(batch_id)
+
+    async def _run(self, job: BatchJob, publish: Callable[[str], str]):
+        # Not part of the request that submitted the batch
+        events.current_session_id.set(None)
+        timings.current_timeline.set(None)
+
+        async def render(item: BatchItem):
+            try:
+                path = await segmented_text_to_speech(item.text, semaphore=self._requests)
+                item.audio_url = publish(path)
+                item.audio_id = os.path.basename(path)
+                item.status = "done"
+                self.rendered += 1
+            except Exception as e:
+                item.status = "failed"
+                item.error = e.detail if isinstance(e, HTTPException) else str(e)
+                self.failed += 1
+                logger.warning(f"TTS batch {job.batch_id[:8]}: could not render {item.text[:30]!r}: {item.error}")
+            job._item_done(item)
+
+        await asyncio.gather(*(render(item) for item in job.items))
+        logger.info(f"TTS batch {job.batch_id[:8]} done: {job.failed} of {len(job.items)} failed")
+
+    async def close(self):
+        """Cancel the batches still rendering."""
+        tasks = [job._task for job in self._jobs.values() if job._task is not None and not job._task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": len(self._jobs),
+            "running": sum(1 for job in self._jobs.values() if not job.finished),
+            "submitted": self.submitted,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "concurrency": self.concurrency,
+            "max_items": TTS_BATCH_MAX_ITEMS,
+        }
+
+
+# Module-level registry used by the /api/speak/batch endpoints
+tts_batches = TTSBatches(TTS_BATCH_CONCURRENCY, TTS_BATCH_RETENTION, TTS_BATCH_MAX_JOBS)
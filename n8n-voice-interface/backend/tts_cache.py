@@ -0,0 +1,282 @@
+import os
+import json
+import shutil
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, List
+from artifacts import ARTIFACT_DIR
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "n8n-voice-tts-cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", "2000"))
+INDEX_FILE = "index.json"
+INDEX_SAVE_DELAY = 1.0  # seconds; index writes within this window are coalesced
+
+
+def cache_key(text: str, model: str, voice: str, audio_format: str) -> str:
+    """
+    Build the content address for a synthesized clip.
+
+    Args:
+        text: The text that was spoken
+        model: The TTS model used
+        voice: The voice used
+        audio_format: The audio container/codec (e.g. "mp3")
+
+    Returns:
+        A hex sha256 digest identifying the clip
+    """
+    material = json.dumps([text, model, voice, audio_format], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Disk-backed LRU cache of synthesized audio.
+
+    Entries are stored as ``<key>.<format>`` files inside ``cache_dir`` and
+    tracked in an ``index.json`` file kept in LRU order (oldest first), so the
+    cache survives restarts. The cache is bounded both by total bytes and by
+    entry count; the least recently used entries are evicted first.
+
+    The index is written by a background thread, at most once per
+    ``INDEX_SAVE_DELAY`` seconds after entries are added or evicted. Hits only
+    reorder it in memory and are persisted with the next write or by
+    ``flush()`` at shutdown, so neither path does disk I/O on the event loop.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, max_entries: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._total_bytes = 0
+        # True when the in-memory LRU order differs from index.json
+        self._dirty = False
+        self._lock = threading.Lock()
+        # Serializes index writes, which happen outside of _lock
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Called with the filename of every entry that leaves the cache
+        self.on_evict: List[Callable[[str], None]] = []
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _load_index(self):
+        """Load the persisted index, dropping entries whose files are gone."""
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read TTS cache index, starting empty: {str(e)}")
+            return
+
+        for entry in stored.get("entries", []):
+            path = os.path.join(self.cache_dir, entry.get("filename", ""))
+            if not entry.get("key") or not os.path.isfile(path):
+                continue
+            entry["size"] = os.path.getsize(path)
+            self._entries[entry["key"]] = entry
+            self._total_bytes += entry["size"]
+
+        logger.info(f"Loaded TTS cache index: {len(self._entries)} entries, {self._total_bytes} bytes")
+        if self._evict():
+            self._dirty = True
+
+    def _save_index(self, entries: List[Dict[str, Any]]):
+        """Atomically persist the index in LRU order."""
+        tmp_path = f"{self.index_path}.tmp"
+        with self._save_lock:
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"entries": entries}, f)
+                os.replace(tmp_path, self.index_path)
+            except Exception as e:
+                logger.warning(f"Could not persist TTS cache index: {str(e)}")
+
+    def _schedule_save(self):
+        """Mark the index changed and write it soon from a timer thread. Called with _lock held."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(INDEX_SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _evict(self) -> bool:
+        """Drop least recently used entries until both limits are satisfied."""
+        evicted = False
+        while self._entries and (
+            self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry["size"]
+            self.evictions += 1
+            evicted = True
+            self._notify_evicted(entry["filename"])
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["filename"]))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Failed to remove evicted TTS cache file {entry['filename']}: {str(e)}")
+        return evicted
+
+    def _notify_evicted(self, filename: str):
+        for callback in self.on_evict:
+            try:
+                callback(filename)
+            except Exception as e:
+                logger.warning(f"TTS cache eviction callback failed: {str(e)}")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a clip and mark it as most recently used.
+
+        Returns:
+            The path of the cached file, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                path = os.path.join(self.cache_dir, entry["filename"])
+                if os.path.isfile(path):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self._dirty = True
+                    return path
+
+                # File removed behind our back - forget about it
+                self._entries.pop(key)
+                self._total_bytes -= entry["size"]
+                self._dirty = True
+                self._notify_evicted(entry["filename"])
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, content: bytes, audio_format: str) -> str:
+        """
+        Store a clip and evict older entries if the cache is over budget.
+
+        Returns:
+            The path of the cached file
+        """
+        tmp_path = self.partial_path(key, audio_format)
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        return self.put_file(key, tmp_path, audio_format)
+
+    def put_file(self, key: str, source_path: str, audio_format: str) -> str:
+        """
+        Move an already written file into the cache, e.g. after streaming it.
+
+        The source should be on the same filesystem as the cache directory
+        for the move to be atomic.
+
+        Returns:
+            The path of the cached file
+        """
+        filename = f"{key}.{audio_format}"
+        path = os.path.join(self.cache_dir, filename)
+        try:
+            os.replace(source_path, path)
+        except OSError:
+            # Different filesystem - fall back to copy and delete
+            shutil.move(source_path, path)
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            # Caching it would evict it (and everything else) right away
+            logger.warning(f"TTS clip of {size} bytes exceeds TTS_CACHE_MAX_BYTES, not caching it")
+            artifact_path = os.path.join(ARTIFACT_DIR, f"{uuid.uuid4()}.{audio_format}")
+            shutil.move(path, artifact_path)
+            return artifact_path
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous["size"]
+
+            self._entries[key] = {"key": key, "filename": filename, "size": size}
+            self._total_bytes += size
+            self._evict()
+            self._schedule_save()
+
+        return path
+
+    def flush(self):
+        """Persist the index now if it changed since the last write."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            entries = list(self._entries.values())
+        self._save_index(entries)
+
+    def path_for(self, filename: str) -> Optional[str]:
+        """
+        Resolve a cached file by its basename, e.g. for /api/audio/{filename}.
+
+        Only the in-memory index is consulted; the file is not stat'ed.
+        """
+        key = filename.rsplit(".", 1)[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["filename"] != filename:
+                return None
+        return os.path.join(self.cache_dir, filename)
+
+    def owns(self, path: str) -> bool:
+        """Return True if the path is inside the cache directory."""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.cache_dir)
+
+    def partial_path(self, key: str, audio_format: str) -> str:
+        """Return a unique scratch path inside the cache directory for a clip being written."""
+        return os.path.join(self.cache_dir, f"{key}.{uuid.uuid4().hex}.{audio_format}.part")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters and current size, for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Shared cache instance used by tts.py
+tts_cache: Optional[TTSCache] = None
+if TTS_CACHE_ENABLED:
+    try:
+        tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, TTS_CACHE_MAX_ENTRIES)
+    except Exception as e:
+        logger.error(f"Could not initialize TTS cache in {TTS_CACHE_DIR}: {str(e)}")
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Dict, Any, Callable, Awaitable, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class StreamInterrupted(Exception):
+    """A streaming synthesis that other requests were waiting on did not complete."""
+
+
+class StreamJob:
+    """
+    The in-flight job of a streaming synthesis.
+
+    The stream resolves it with the finished file once the audio has been
+    passed through, or fails it. A job dropped without being resolved (a
+    stream generator that was never iterated) fails when it is garbage
+    collected, so waiters never hang.
+    """
+
+    __slots__ = ("_future",)
+
+    def __init__(self, future: "asyncio.Future[str]"):
+        self._future = future
+
+    def done(self, path: str):
+        if not self._future.done():
+            self._future.set_result(path)
+
+    def fail(self):
+        if not self._future.done():
+            self._future.set_exception(StreamInterrupted())
+
+    def __del__(self):
+        try:
+            self.fail()
+        except RuntimeError:
+            # Event loop already closed
+            pass
+
+
+class TTSJobs:
+    """
+    In-flight TTS syntheses, keyed by text and voice settings.
+
+    A request for audio that is already being synthesized waits for the
+    running job instead of calling the API again. Jobs run as tasks of their
+    own, so a caller that goes away doesn't cancel the synthesis the others
+    are waiting for; the result still lands in the TTS cache. A job only
+    lives while it runs - finished audio is served by the cache.
+    All operations run on the event loop.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, "asyncio.Future[str]"] = {}
+        self.started = 0
+        self.joined = 0
+        self.failed = 0
+
+    def running(self, key: str) -> Optional["asyncio.Future[str]"]:
+        job = self._jobs.get(key)
+        if job is not None and not job.done():
+            return job
+        return None
+
+    def _track(self, key: str, job: "asyncio.Future[str]"):
+        self._jobs[key] = job
+        self.started += 1
+        job.add_done_callback(lambda finished: self._finish(key, finished))
+
+    def _finish(self, key: str, job: "asyncio.Future[str]"):
+        if self._jobs.get(key) is job:
+            del self._jobs[key]
+        # Retrieve the exception even if every waiter went away
+        if job.cancelled() or job.exception() is not None:
+            self.failed += 1
+
+    async def run(self, key: str, synthesize: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the result of the running job for ``key``, or start one with ``synthesize``.
+
+        Args:
+            key: Identifies the audio (text and TTS settings)
+            synthesize: Coroutine function producing the audio file path
+
+        Returns:
+            The path of the synthesized audio file
+        """
+        job = self.running(key)
+        while job is not None:
+            self.joined += 1
+            logger.info(f"Joining in-flight TTS job {key[:12]}")
+            try:
+                return await asyncio.shield(job)
+            except StreamInterrupted:
+                # The streaming client went away before the audio was complete
+                logger.info(f"In-flight TTS stream {key[:12]} was interrupted, synthesizing again")
+                job = self.running(key)
+
+        task = asyncio.ensure_future(synthesize())
+        self._track(key, task)
+        return await asyncio.shield(task)
+
+    def claim(self, key: str) -> StreamJob:
+        """Register a streaming synthesis for ``key``, resolved by the stream itself."""
+        future = asyncio.get_running_loop().create_future()
+        self._track(key, future)
+        return StreamJob(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": sum(1 for job in self._jobs.values() if not job.done()),
+            "started": self.started,
+            "joined": self.joined,
+            "failed": self.failed,
+        }
+
+
+# Module-level registry shared by all TTS paths
+tts_jobs = TTSJobs()
@@ -0,0 +1,332 @@
+import os
+import re
+import uuid
+import shutil
+import asyncio
+import logging
+from typing import List, AsyncIterator, Optional
+from tts import (
+    text_to_speech,
+    stream_text_to_speech,
+    TTS_MODEL,
+    TTS_VOICE,
+    TTS_FORMAT,
+    STREAM_CHUNK_SIZE,
+    iter_file,
+)
+from tts_cache import tts_cache, cache_key
+from tts_jobs import tts_jobs
+from artifacts import ARTIFACT_DIR
+import timings
+import events
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+TTS_SEGMENTATION_ENABLED = os.getenv("TTS_SEGMENTATION_ENABLED", "true").lower() not in ("0", "false", "no")
+TTS_SEGMENT_MAX_CHARS = min(int(os.getenv("TTS_SEGMENT_MAX_CHARS", "400")), 4096)  # API input limit is 4096
+TTS_SEGMENT_MIN_CHARS = int(os.getenv("TTS_SEGMENT_MIN_CHARS", "40"))
+TTS_SEGMENT_CONCURRENCY = int(os.getenv("TTS_SEGMENT_CONCURRENCY", "4"))
+
+# Formats whose encoded segments can simply be concatenated into one playable file
+CONCATENABLE_FORMATS = ("mp3", "aac")
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n+")
+CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:–—])\s+")
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Split a sentence longer than max_chars at clause boundaries, then at spaces."""
+    pieces: List[str] = []
+    current = ""
+    for part in CLAUSE_BOUNDARY.split(sentence):
+        while len(part) > max_chars:
+            cut = part.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(part[:cut].strip())
+            part = part[cut:].strip()
+
+        if current and len(current) + 1 + len(part) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}".strip()
+
+    if current:
+        pieces.append(current)
+    return [piece for piece in pieces if piece]
+
+
+def split_into_segments(text: str, max_chars: int = TTS_SEGMENT_MAX_CHARS,
+                        min_chars: int = TTS_SEGMENT_MIN_CHARS) -> List[str]:
+    """
+    Split a reply into segments for pipelined synthesis.
+
+    The first segment is kept short (the first sentence, padded up to
+    ``min_chars``) so it can start playing quickly; the following sentences
+    are packed into segments of up to ``max_chars``. Sentences longer than
+    ``max_chars`` are split at clause boundaries.
+
+    Args:
+        text: The text to split
+        max_chars: Maximum segment length
+        min_chars: Segments shorter than this are merged with the next sentence
+
+    Returns:
+        The segments, in reading order
+    """
+    sentences: List[str] = []
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > max_chars:
+            sentences.extend(_split_long(sentence, max_chars))
+        else:
+            sentences.append(sentence)
+
+    segments: List[str] = []
+    current = ""
+    for sentence in sentences:
+        # The first segment closes as soon as it is long enough to be worth a request
+        limit = min_chars if not segments else max_chars
+        if current and (len(current) >= limit or len(current) + 1 + len(sentence) > max_chars):
+            segments.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+
+    if current:
+        segments.append(current)
+    return segments
+
+
+def _segmentation_applies(segments: List[str]) -> bool:
+    return TTS_SEGMENTATION_ENABLED and TTS_FORMAT in CONCATENABLE_FORMATS and len(segments) > 1
+
+
+def _full_text_cached(text: str) -> bool:
+    if tts_cache is None:
+        return False
+    key = cache_key(text, TTS_MODEL, TTS_VOICE, TTS_FORMAT)
+    return tts_cache.path_for(f"{key}.{TTS_FORMAT}") is not None
+
+
+def _render_segments(segments: List[str], offset: int = 0,
+                     semaphore: Optional[asyncio.Semaphore] = None) -> List["asyncio.Task[str]"]:
+    """
+    Start synthesis of all segments with bounded parallelism.
+
+    ``offset`` is the position of the first segment in the whole reply, for progress events.
+    ``semaphore`` bounds the requests; by default each call gets its own of
+    TTS_SEGMENT_CONCURRENCY.
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(TTS_SEGMENT_CONCURRENCY)
+
+    async def render(index: int, segment: str) -> str:
+        async with semaphore:
+            path = await text_to_speech(segment)
+        events.emit("tts_segment", {"index": offset + index, "count": offset + len(segments)})
+        return path
+
+    return [asyncio.ensure_future(render(index, segment)) for index, segment in enumerate(segments)]
+
+
+def _concatenate(paths: List[str]) -> str:
+    """
+    Join segment files into one file in the artifact directory.
+
+    Only the segments are cached, so a reply is not stored twice; a replay
+    is rebuilt from the cached segments.
+    """
+    output_file = os.path.join(ARTIFACT_DIR, f"{uuid.uuid4()}.{TTS_FORMAT}")
+    with open(output_file, "wb") as output:
+        for path in paths:
+            with open(path, "rb") as segment_file:
+                shutil.copyfileobj(segment_file, output, STREAM_CHUNK_SIZE)
+    return output_file
+
+
+async def segmented_text_to_speech(text: str, semaphore: Optional[asyncio.Semaphore] = None) -> str:
+    """
+    Convert text to speech, synthesizing long replies sentence by sentence in parallel.
+
+    Short texts (and formats that can't be concatenated) go through
+    text_to_speech unchanged. A request for a text that is already being
+    synthesized waits for that job.
+
+    Args:
+        text: The text to speak
+        semaphore: Bounds every synthesis request made for the text, shared
+            with other callers (pre-render batches); without it only the
+            segments of this text are limited, to TTS_SEGMENT_CONCURRENCY
+
+    Returns:
+        The path of the audio file for the whole text
+    """
+    segments = split_into_segments(text)
+    if _full_text_cached(text) or (semaphore is None and not _segmentation_applies(segments)):
+        return await text_to_speech(text)
+    if not _segmentation_applies(segments):
+        async with semaphore:
+            return await text_to_speech(text)
+
+    key = cache_key(text, TTS_MODEL, TTS_VOICE, TTS_FORMAT)
+    return await tts_jobs.run(f"segmented:{key}", lambda: _synthesize_segments(text, segments, semaphore))
+
+
+async def _synthesize_segments(text: str, segments: List[str],
+                               semaphore: Optional[asyncio.Semaphore] = None) -> str:
+    logger.info(f"Synthesizing {len(segments)} segments with concurrency {TTS_SEGMENT_CONCURRENCY}")
+    tasks = _render_segments(segments, semaphore=semaphore)
+    try:
+        paths = await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    with timings.stage("write"):
+        output_file = _concatenate(paths)
+    logger.info(f"Segmented TTS successful: Output saved to {output_file}")
+    return output_file
+
+
+async def stream_segmented_speech(text: str) -> AsyncIterator[bytes]:
+    """
+    Stream speech for a possibly long text.
+
+    The first segment is streamed from the API as it is synthesized while
+    the remaining segments render concurrently; their audio is emitted in
+    order as soon as each one is ready.
+
+    Returns:
+        An async iterator over the audio bytes
+    """
+    segments = split_into_segments(text)
+    if not _segmentation_applies(segments) or _full_text_cached(text):
+        return await stream_text_to_speech(text)
+
+    logger.info(f"Streaming {len(segments)} segments with concurrency {TTS_SEGMENT_CONCURRENCY}")
+    tasks = _render_segments(segments[1:], offset=1)
+    try:
+        first_stream = await stream_text_to_speech(segments[0])
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return _emit_in_order(first_stream, tasks)
+
+
+async def _emit_in_order(first_stream: AsyncIterator[bytes],
+                         tasks: List["asyncio.Task[str]"]) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in first_stream:
+            yield chunk
+
+        for task in tasks:
+            async for chunk in iter_file(await task):
+                yield chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def sentences(text_stream: AsyncIterator[str], min_chars: int = TTS_SEGMENT_MIN_CHARS,
+                    max_chars: int = TTS_SEGMENT_MAX_CHARS) -> AsyncIterator[str]:
+    """
+    Group text that is still arriving into segments, yielding each as soon as it is complete.
+
+    A sentence is complete once the text after its closing punctuation has
+    started. Sentences shorter than ``min_chars`` are joined with the next
+    one, and sentences longer than ``max_chars`` are split like in
+    split_into_segments. Whatever is left when the stream ends is yielded last.
+    """
+    pending = ""
+    ready = ""
+    async for delta in text_stream:
+        pending += delta
+        parts = SENTENCE_BOUNDARY.split(pending)
+        # The last part may still be growing
+        pending = parts.pop()
+        for part in parts:
+            part = part.strip()
+            if not part:
+                continue
+            for piece in (_split_long(part, max_chars) if len(part) > max_chars else [part]):
+                ready = f"{ready} {piece}".strip()
+                if len(ready) >= min_chars:
+                    yield ready
+                    ready = ""
+
+    pending = pending.strip()
+    for piece in (_split_long(pending, max_chars) if len(pending) > max_chars else [pending]):
+        ready = f"{ready} {piece}".strip()
+        if len(ready) >= min_chars:
+            yield ready
+            ready = ""
+    if ready:
+        yield ready
+
+
+async def stream_incremental_speech(text_stream: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """
+    Speak text that is still being generated, e.g. a streamed n8n reply.
+
+    Each sentence is synthesized as soon as it is complete, up to
+    TTS_SEGMENT_CONCURRENCY at once: the first one is streamed from the API,
+    the rest are emitted in order as they are ready. Formats that can't be
+    concatenated are spoken once the whole text has arrived.
+
+    Returns:
+        An async iterator over the audio bytes
+    """
+    if TTS_FORMAT not in CONCATENABLE_FORMATS:
+        text = "".join([delta async for delta in text_stream])
+        async for chunk in await stream_text_to_speech(text):
+            yield chunk
+        return
+
+    semaphore = asyncio.Semaphore(TTS_SEGMENT_CONCURRENCY)
+    # The first segment as text (it is streamed), then synthesis tasks; None at the end
+    queue: asyncio.Queue = asyncio.Queue()
+    spoken: List[str] = []
+
+    async def render(segment: str) -> str:
+        async with semaphore:
+            return await text_to_speech(segment)
+
+    async def produce():
+        try:
+            async for segment in sentences(text_stream):
+                queue.put_nowait(segment if not spoken else asyncio.ensure_future(render(segment)))
+                spoken.append(segment)
+        except Exception as e:
+            # Speak what has arrived so far
+            logger.error(f"Streamed reply failed after {len(spoken)} segments: {str(e)}")
+        finally:
+            queue.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, str):
+                async for chunk in await stream_text_to_speech(item):
+                    yield chunk
+                continue
+            async for chunk in iter_file(await item):
+                yield chunk
+    finally:
+        producer.cancel()
+        while not queue.empty():
+            item = queue.get_nowait()
+            if isinstance(item, asyncio.Future):
+                item.cancel()
+
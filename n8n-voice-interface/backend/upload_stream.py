@@ -0,0 +1,218 @@
+import os
+import time
+import struct
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional
+from fastapi import Request, HTTPException
+import timings
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))  # OpenAI STT file limit
+MAX_AUDIO_SECONDS = float(os.getenv("MAX_AUDIO_SECONDS", "600"))
+MAX_FIELD_BYTES = 64 * 1024
+# Allowance for boundaries, part headers and text fields around the file
+MAX_FORM_OVERHEAD_BYTES = 256 * 1024
+
+
+def wav_duration(header: bytes) -> Optional[float]:
+    """
+    Estimate the duration of a WAV file from its RIFF header.
+
+    Returns:
+        The duration in seconds, or None if the header is not a PCM WAV header
+    """
+    if len(header) < 44 or header[0:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    riff_size = struct.unpack("<I", header[4:8])[0]
+    byte_rate = struct.unpack("<I", header[28:32])[0]
+    if not byte_rate or riff_size in (0, 0xFFFFFFFF):
+        return None
+    return max(riff_size + 8 - 44, 0) / byte_rate
+
+
+class StreamingUpload:
+    """
+    Incremental multipart/form-data reader for audio uploads.
+
+    The request body is parsed as it arrives: text fields are collected, and
+    the bytes of the file field are handed out chunk by chunk through
+    ``chunks()`` without ever holding the whole recording in memory or on disk.
+    Size and duration limits are checked before the first audio byte is
+    released, so oversized uploads never reach the STT provider.
+    """
+
+    def __init__(self, request: Request, file_field: str = "audio",
+                 max_bytes: int = MAX_UPLOAD_BYTES, max_seconds: float = MAX_AUDIO_SECONDS):
+        self.request = request
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size = 0
+
+        self._stream = request.stream()
+        self._body_done = False
+        self._parser: Optional[MultipartParser] = None
+        self._pending: Deque[bytes] = deque()
+        self._file_started = False
+        self._file_done = False
+
+        # State of the part currently being parsed
+        self._header_field = b""
+        self._header_value = b""
+        self._part_headers: Dict[str, bytes] = {}
+        self._part_name: Optional[str] = None
+        self._part_is_file = False
+        self._field_buffer = bytearray()
+
+    @property
+    def declared_length(self) -> Optional[int]:
+        length = self.request.headers.get("content-length")
+        return int(length) if length and length.isdigit() else None
+
+    def _check_limits_before_read(self):
+        """
+        Reject uploads whose declared size or duration is over the limit.
+
+        Content-Length covers the whole form, so only bodies larger than the
+        file limit plus MAX_FORM_OVERHEAD_BYTES are refused here; the exact
+        limit is enforced on the file bytes as they are parsed.
+        """
+        length = self.declared_length
+        if length is not None and length > self.max_bytes + MAX_FORM_OVERHEAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload too large ({length} bytes, limit {self.max_bytes})")
+
+        declared_duration = self.request.headers.get("x-audio-duration")
+        if declared_duration:
+            try:
+                seconds = float(declared_duration)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid X-Audio-Duration header")
+            if seconds > self.max_seconds:
+                raise HTTPException(status_code=413, detail=f"Recording too long ({seconds:.0f}s, limit {self.max_seconds:.0f}s)")
+
+    async def open(self) -> "StreamingUpload":
+        """
+        Start parsing and stop once the first bytes of the file are available.
+        """
+        self._check_limits_before_read()
+
+        content_type, params = parse_options_header(self.request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+        while not self._pending and not self._file_done and not self._body_done:
+            await self._feed()
+
+        if not self._file_started:
+            raise HTTPException(status_code=400, detail=f"Missing '{self.file_field}' file in upload")
+
+        # Check the real duration for WAV uploads before anything is forwarded
+        if self._pending:
+            duration = wav_duration(self._pending[0])
+            if duration is not None and duration > self.max_seconds:
+                raise HTTPException(status_code=413, detail=f"Recording too long ({duration:.0f}s, limit {self.max_seconds:.0f}s)")
+
+        return self
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Yield the file bytes as they arrive from the client."""
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            if self._file_done or self._body_done:
+                return
+            await self._feed()
+
+    async def finish(self) -> Dict[str, str]:
+        """Read the rest of the body and return all text fields."""
+        while not self._body_done:
+            await self._feed()
+            # Anything after the file is not needed by the caller
+            self._pending.clear()
+        return self.fields
+
+    async def _feed(self):
+        """Pull one chunk from the request body through the parser."""
+        started = time.perf_counter()
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            chunk = b""
+        timings.record("upload", started)
+
+        if not chunk:
+            self._body_done = True
+            self._parser.finalize()
+            return
+
+        self._parser.write(chunk)
+
+    # Parser callbacks
+
+    def _on_part_begin(self):
+        self._part_headers = {}
+        self._part_name = None
+        self._part_is_file = False
+        self._field_buffer = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._part_headers[self._header_field.decode("latin-1").lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._part_headers.get("content-disposition", b""))
+        self._part_name = options.get(b"name", b"").decode("utf-8")
+        if self._part_name == self.file_field and b"filename" in options and not self._file_started:
+            self._part_is_file = True
+            self._file_started = True
+            self.filename = options[b"filename"].decode("utf-8")
+            self.content_type = self._part_headers.get("content-type", b"application/octet-stream").decode("latin-1")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._part_is_file:
+            self.size += end - start
+            if self.size > self.max_bytes:
+                raise HTTPException(status_code=413, detail=f"Upload too large (limit {self.max_bytes} bytes)")
+            self._pending.append(data[start:end])
+        else:
+            self._field_buffer += data[start:end]
+            if len(self._field_buffer) > MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field '{self._part_name}' too large")
+
+    def _on_part_end(self):
+        if self._part_is_file:
+            self._file_done = True
+            logger.info(f"Streamed upload {self.filename}: {self.size} bytes")
+        elif self._part_name:
+            self.fields[self._part_name] = self._field_buffer.decode("utf-8")
+        self._part_is_file = False
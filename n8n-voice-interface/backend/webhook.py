@@ -1,18 +1,380 @@
+import os
+import time
+import random
+import asyncio
 import logging
 import json
+import codecs
 import httpx
-from typing import Dict, Any, Optional, Union
+from collections import deque
+from typing import Dict, Any, Optional, Union, List, AsyncIterator
+from http_client import get_client
+from admission import n8n_limiter, Overloaded
+from circuit_breaker import circuit_breakers, N8N_BREAKER_ENABLED
+import metrics
+import timings
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-async def send_to_n8n(webhook_url: str, data: Dict[str, Any]) -> Union[Dict[str, Any], bool]:
+# Constants
+N8N_TIMEOUT = float(os.getenv("N8N_TIMEOUT", "10"))  # per attempt
+N8N_TURN_BUDGET = float(os.getenv("N8N_TURN_BUDGET", "15"))  # all attempts of one turn, including backoff
+N8N_MAX_ATTEMPTS = int(os.getenv("N8N_MAX_ATTEMPTS", "3"))
+N8N_BACKOFF_BASE = float(os.getenv("N8N_BACKOFF_BASE", "0.25"))
+N8N_BACKOFF_MAX = float(os.getenv("N8N_BACKOFF_MAX", "2"))
+N8N_HEDGE_AFTER = float(os.getenv("N8N_HEDGE_AFTER", "0"))  # 0 disables hedged requests
+N8N_STREAMING_ENABLED = os.getenv("N8N_STREAMING_ENABLED", "true").lower() not in ("0", "false", "no")
+N8N_MAX_RESPONSE_BYTES = int(os.getenv("N8N_MAX_RESPONSE_BYTES", str(1024 * 1024)))
+# Spoken when n8n can't be reached; pre-rendered at startup so it plays without waiting for TTS
+N8N_FALLBACK_TEXT = os.getenv(
+    "N8N_FALLBACK_TEXT",
+    "Could not connect to the n8n webhook. Please check if your n8n instance is running and accessible."
+)
+
+# Replaying a webhook POST may run a non-idempotent workflow twice, so by
+# default only failures where the request never reached n8n (connect phase)
+# or n8n refused it outright (429, 503) are retried
+N8N_RETRY_AMBIGUOUS = os.getenv("N8N_RETRY_AMBIGUOUS", "false").lower() in ("1", "true", "yes")
+RETRYABLE_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+)
+RETRYABLE_STATUS = (429, 503)
+# The workflow may already have run: the connection broke after the request
+# was sent, or a gateway gave up waiting. Only retried when opted in.
+if N8N_RETRY_AMBIGUOUS:
+    RETRYABLE_ERRORS += (httpx.RemoteProtocolError,)
+    RETRYABLE_STATUS += (502, 504)
+
+# Reply formats read incrementally; chunked text/plain (no Content-Length) is streamed too
+STREAMING_CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json-lines": "ndjson",
+    "text/event-stream": "sse",
+}
+
+
+class CallStats:
+    """Counters and recent history of n8n webhook calls, used to tune retries and hedging."""
+
+    def __init__(self, history_size: int = 50):
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+        self.failed = 0
+        self.recent = deque(maxlen=history_size)
+
+
+stats = CallStats()
+
+
+class _Call:
+    """Record of one send_to_n8n call: every request made and which one answered."""
+
+    def __init__(self, webhook_url: str):
+        self.host = httpx.URL(webhook_url).host
+        self.started = time.monotonic()
+        self.attempts: List[Dict[str, Any]] = []
+        self.winner: Optional[Dict[str, Any]] = None
+
+    def add(self, attempt: int, hedge: bool, outcome: str, started: float):
+        self.attempts.append({
+            "attempt": attempt,
+            "hedge": hedge,
+            "outcome": outcome,
+            "seconds": round(time.monotonic() - started, 3),
+        })
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "attempts": self.attempts,
+            "winner": self.winner,
+            "seconds": round(time.monotonic() - self.started, 3),
+        }
+
+
+def _stream_format(response: httpx.Response) -> Optional[str]:
+    """Return "ndjson", "sse" or "text" if a successful reply is streamed, None if it is read whole."""
+    if not N8N_STREAMING_ENABLED or response.status_code != 200:
+        return None
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in STREAMING_CONTENT_TYPES:
+        return STREAMING_CONTENT_TYPES[content_type]
+    if content_type == "text/plain" and "content-length" not in response.headers:
+        return "text"
+    return None
+
+
+def _text_of(item: Any) -> Optional[str]:
+    """Text carried by one streamed item: n8n's {"type": "item", "content": ...} chunks, or common fields."""
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        if item.get("type") in ("begin", "end"):
+            return None
+        if item.get("type") == "error":
+            logger.error(f"n8n reported an error while streaming: {item.get('content')}")
+            return None
+        for key in ("content", "text", "delta", "output"):
+            if isinstance(item.get(key), str):
+                return item[key]
+    return None
+
+
+class ReplyStream:
+    """
+    An n8n reply that arrives incrementally: NDJSON, Server-Sent Events or chunked text.
+
+    Iterating yields text as it arrives, and ``text`` holds everything
+    received so far. Reading stops after N8N_MAX_RESPONSE_BYTES. The response
+    is closed when the iteration ends or ``aclose`` is called.
+    """
+
+    def __init__(self, response: httpx.Response, stream_format: str):
+        self._response = response
+        self.format = stream_format
+        self.text = ""
+        self.truncated = False
+
+    def _parse_line(self, line: str) -> Optional[str]:
+        line = line.strip()
+        if self.format == "sse":
+            if not line.startswith("data:"):
+                return None
+            line = line[len("data:"):].strip()
+            if line == "[DONE]":
+                return None
+        if not line:
+            return None
+        try:
+            return _text_of(json.loads(line))
+        except json.JSONDecodeError:
+            # SSE data may be plain text; a broken NDJSON line is skipped
+            return line if self.format == "sse" else None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        received = 0
+        pending = ""
+        try:
+            async for chunk in self._response.aiter_bytes():
+                received += len(chunk)
+                if received > N8N_MAX_RESPONSE_BYTES:
+                    chunk = chunk[:len(chunk) - (received - N8N_MAX_RESPONSE_BYTES)]
+                    self.truncated = True
+                data = decoder.decode(chunk, final=self.truncated)
+                if self.format == "text":
+                    deltas = [data]
+                else:
+                    pending += data
+                    *lines, pending = pending.split("\n")
+                    deltas = [self._parse_line(line) for line in lines]
+                for delta in deltas:
+                    if delta:
+                        self.text += delta
+                        yield delta
+                if self.truncated:
+                    logger.warning(f"n8n reply exceeded {N8N_MAX_RESPONSE_BYTES} bytes, ignoring the rest")
+                    break
+
+            if pending and self.format != "text":
+                delta = self._parse_line(pending + decoder.decode(b"", final=True))
+                if delta:
+                    self.text += delta
+                    yield delta
+        finally:
+            await self._response.aclose()
+
+    async def collect(self) -> str:
+        """Read the rest of the reply and return its whole text."""
+        async for _ in self:
+            pass
+        return self.text
+
+    async def aclose(self):
+        await self._response.aclose()
+
+
+async def _read_capped(response: httpx.Response) -> httpx.Response:
+    """Read a reply that is not streamed, keeping at most N8N_MAX_RESPONSE_BYTES of its body."""
+    body = bytearray()
+    try:
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) > N8N_MAX_RESPONSE_BYTES:
+                logger.warning(f"n8n reply exceeded {N8N_MAX_RESPONSE_BYTES} bytes, ignoring the rest")
+                del body[N8N_MAX_RESPONSE_BYTES:]
+                break
+    finally:
+        await response.aclose()
+    # The body is already decoded, so drop the headers describing the wire format
+    headers = [
+        (name, value) for name, value in response.headers.multi_items()
+        if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+    ]
+    return httpx.Response(response.status_code, headers=headers, content=bytes(body), request=response.request)
+
+
+def _backoff(attempt: int, response: Optional[httpx.Response]) -> float:
+    """Full-jitter exponential backoff, stretched to the server's Retry-After if it sent one."""
+    delay = random.uniform(0, min(N8N_BACKOFF_MAX, N8N_BACKOFF_BASE * (2 ** (attempt - 1))))
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+
+async def _request(webhook_url: str, payload: Dict[str, Any], headers: Dict[str, str], timeout: float,
+                   call: _Call, attempt: int, hedge: bool) -> httpx.Response:
+    """
+    Make one request to the webhook and record its outcome.
+
+    Streamed replies (see _stream_format) are returned open, right after the
+    headers; anything else is read up to N8N_MAX_RESPONSE_BYTES. ``timeout``
+    caps the whole attempt, including the wait for an n8n slot and reading
+    the body; httpx's own timeouts only bound each phase.
+    """
+    started = time.monotonic()
+
+    async def attempt_request() -> httpx.Response:
+        client = get_client()
+        async with n8n_limiter.limit():
+            request = client.build_request(
+                "POST",
+                webhook_url,
+                json=payload,
+                headers=headers,
+                timeout=httpx.Timeout(timeout)
+            )
+            response = await client.send(request, stream=True)
+            if _stream_format(response) is None:
+                response = await _read_capped(response)
+            return response
+
+    try:
+        try:
+            response = await asyncio.wait_for(attempt_request(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout(f"n8n attempt exceeded {timeout:.1f}s") from None
+    except asyncio.CancelledError:
+        call.add(attempt, hedge, "cancelled", started)
+        raise
+    except Exception as e:
+        call.add(attempt, hedge, type(e).__name__, started)
+        raise
+    call.add(attempt, hedge, str(response.status_code), started)
+    return response
+
+
+async def _hedged_attempt(webhook_url: str, payload: Dict[str, Any], headers: Dict[str, str],
+                          remaining: float, call: _Call, attempt: int) -> httpx.Response:
+    """
+    Make one attempt, sending a second (hedged) request if the first is slow.
+
+    The first request to return a non-retryable response wins and the other
+    one is cancelled. If both fail, the last failure is returned or raised.
+    """
+    timeout = min(N8N_TIMEOUT, remaining)
+    primary = asyncio.ensure_future(_request(webhook_url, payload, headers, timeout, call, attempt, False))
+    tasks = {primary: False}
+    result: Optional[httpx.Response] = None
+    error: Optional[BaseException] = None
+    try:
+        if 0 < N8N_HEDGE_AFTER < remaining:
+            done, _ = await asyncio.wait({primary}, timeout=N8N_HEDGE_AFTER)
+            if not done:
+                stats.hedges += 1
+                logger.info(f"n8n webhook slower than {N8N_HEDGE_AFTER}s, sending hedged request")
+                hedge = asyncio.ensure_future(_request(
+                    webhook_url, payload, headers, min(N8N_TIMEOUT, remaining - N8N_HEDGE_AFTER), call, attempt, True
+                ))
+                tasks[hedge] = True
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                result = task.result()
+                if result.status_code not in RETRYABLE_STATUS:
+                    call.winner = {"attempt": attempt, "hedge": tasks[task]}
+                    if tasks[task]:
+                        stats.hedge_wins += 1
+                    return result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif task.exception() is None and task.result() is not result:
+                # A streamed reply that lost the race is still open
+                await task.result().aclose()
+
+    if result is not None:
+        return result
+    raise error
+
+
+async def _post_with_retries(webhook_url: str, payload: Dict[str, Any], headers: Dict[str, str],
+                             call: _Call) -> httpx.Response:
+    """
+    POST to the webhook, retrying transient failures within N8N_TURN_BUDGET.
+
+    Returns:
+        The winning response, or the last retryable response if attempts ran out
+
+    Raises:
+        The last connection error if no attempt got a response
+    """
+    deadline = call.started + N8N_TURN_BUDGET
+    attempt = 0
+    while True:
+        attempt += 1
+        if attempt > 1:
+            stats.retries += 1
+        response = None
+        try:
+            response = await _hedged_attempt(webhook_url, payload, headers, deadline - time.monotonic(), call, attempt)
+        except RETRYABLE_ERRORS as e:
+            if attempt >= N8N_MAX_ATTEMPTS:
+                raise
+            logger.warning(f"n8n webhook attempt {attempt} failed: {type(e).__name__}")
+            failure = e
+        else:
+            if response.status_code not in RETRYABLE_STATUS or attempt >= N8N_MAX_ATTEMPTS:
+                return response
+            logger.warning(f"n8n webhook attempt {attempt} returned {response.status_code}")
+
+        delay = _backoff(attempt, response)
+        if time.monotonic() + delay >= deadline:
+            stats.budget_exhausted += 1
+            logger.warning(f"n8n turn budget of {N8N_TURN_BUDGET}s exhausted after {attempt} attempts")
+            if response is not None:
+                return response
+            raise failure
+        await asyncio.sleep(delay)
+
+
+async def send_to_n8n(webhook_url: str, data: Dict[str, Any],
+                      allow_stream: bool = False) -> Union[Dict[str, Any], bool]:
     """
     Send data to n8n webhook and return the response if available.
     
     Args:
         webhook_url: The n8n webhook URL to send data to
         data: The data to send (will be converted to JSON)
+        allow_stream: Return a streamed reply as ``{"text_stream": ReplyStream}``
+            as soon as it starts, instead of reading it whole
     
     Returns:
         The n8n response as a dict if available, or True/False for success/failure
@@ -40,6 +402,10 @@ async def send_to_n8n(webhook_url: str, data: Dict[str, Any]) -> Union[Dict[str,
                 "version": "1.0.0"
             }
         }
+        # Async mode: the workflow answers later by POSTing the reply to callback_url
+        for key in ("correlation_id", "callback_url"):
+            if data.get(key):
+                payload[key] = data[key]
         
         # Set up headers
         headers = {
@@ -47,61 +413,115 @@ async def send_to_n8n(webhook_url: str, data: Dict[str, Any]) -> Union[Dict[str,
             "Accept": "application/json"
         }
         
-        # Set timeout to avoid long waits
-        timeout = httpx.Timeout(10.0)
+        # Don't wait for a webhook that has been failing - answer with the fallback right away
+        breaker = circuit_breakers.get(webhook_url) if N8N_BREAKER_ENABLED else None
+        if breaker is not None and not breaker.allow():
+            logger.warning(f"Circuit for {breaker.key} is open, returning fallback reply")
+            return {"text": N8N_FALLBACK_TEXT, "fallback": True}
+
+        # Send the request, retrying transient failures
+        stats.calls += 1
+        call = _Call(webhook_url)
+        succeeded = None
+        started = time.perf_counter()
+        metrics.in_flight.inc("n8n")
+        try:
+            response = await _post_with_retries(webhook_url, payload, headers, call)
+            succeeded = response.status_code < 500 and response.status_code != 429
+        except httpx.HTTPError:
+            succeeded = False
+            raise
+        finally:
+            metrics.in_flight.dec("n8n")
+            metrics.n8n_seconds.observe(time.perf_counter() - started)
+            timings.record("n8n", started)
+            if not succeeded:
+                metrics.errors.inc("n8n")
+            stats.attempts += len(call.attempts)
+            if call.winner is None:
+                stats.failed += 1
+            stats.recent.append(call.as_dict())
+            if breaker is not None:
+                breaker.record(succeeded)
         
-        # Send the request
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                webhook_url, 
-                json=payload,
-                headers=headers
-            )
-            
-            # Check response
-            if response.status_code == 200:
+        # A streamed reply is read as it arrives
+        stream_format = _stream_format(response)
+        if stream_format is not None:
+            reply = ReplyStream(response, stream_format)
+            logger.info(f"Webhook successful. Streaming {stream_format} response")
+            if allow_stream:
+                return {"text_stream": reply}
+            # Read whole, the reply still has to arrive within the turn budget
+            remaining = call.started + N8N_TURN_BUDGET - time.monotonic()
+            try:
+                return {"text": await asyncio.wait_for(reply.collect(), timeout=max(remaining, 0))}
+            except asyncio.TimeoutError:
+                stats.budget_exhausted += 1
+                raise httpx.ReadTimeout(f"n8n reply not complete within the {N8N_TURN_BUDGET}s turn budget") from None
+
+        # Check response
+        if response.status_code == 200:
+            try:
+                # Try to parse the response as JSON
+                response_text = response.text
+                logger.info(f"Webhook successful. Response: {len(response_text)} characters")
+                
                 try:
-                    # Try to parse the response as JSON
-                    response_text = response.text
-                    logger.info(f"Webhook successful. Response: {response_text}")
+                    response_json = json.loads(response_text)
                     
-                    try:
-                        response_json = response.json()
+                    # Check if the response has a text field
+                    if isinstance(response_json, dict) and "text" in response_json:
+                        return response_json
+                    else:
+                        # Try to extract text from different formats
+                        if isinstance(response_json, dict):
+                            # Try common formats
+                            for key in ["message", "response", "content", "result"]:
+                                if key in response_json and isinstance(response_json[key], str):
+                                    return {"text": response_json[key]}
+                        
+                        # If response is just a string, wrap it
+                        if isinstance(response_json, str):
+                            return {"text": response_json}
                         
-                        # Check if the response has a text field
-                        if isinstance(response_json, dict) and "text" in response_json:
-                            return response_json
-                        else:
-                            # Try to extract text from different formats
-                            if isinstance(response_json, dict):
-                                # Try common formats
-                                for key in ["message", "response", "content", "result"]:
-                                    if key in response_json and isinstance(response_json[key], str):
-                                        return {"text": response_json[key]}
-                            
-                            # If response is just a string, wrap it
-                            if isinstance(response_json, str):
-                                return {"text": response_json}
-                            
-                            # If we can't find a text field, use the whole response as text
-                            return {"text": response_text}
-                    except json.JSONDecodeError:
-                        # If it's not JSON, use the raw text
+                        # If we can't find a text field, use the whole response as text
                         return {"text": response_text}
-                except Exception as e:
-                    logger.error(f"Error parsing webhook response: {str(e)}")
-                    return True
-            else:
-                error_text = response.text
-                logger.error(f"Webhook failed with status {response.status_code}: {error_text}")
-                return False
+                except json.JSONDecodeError:
+                    # If it's not JSON, use the raw text
+                    return {"text": response_text}
+            except Exception as e:
+                logger.error(f"Error parsing webhook response: {str(e)}")
+                return True
+        else:
+            error_text = response.text
+            logger.error(f"Webhook failed with status {response.status_code}: {error_text}")
+            return False
     
+    except Overloaded:
+        raise
     except httpx.ConnectError as e:
         logger.error(f"Connection error when sending webhook: {str(e)}")
-        return {"text": f"Could not connect to the n8n webhook. Please check if your n8n instance is running and accessible."}
+        return {"text": N8N_FALLBACK_TEXT, "fallback": True}
     except httpx.HTTPError as e:
         logger.error(f"HTTP error when sending webhook: {str(e)}")
         return {"text": f"Error connecting to webhook: {str(e)}"}
     except Exception as e:
         logger.error(f"Error sending webhook: {str(e)}", exc_info=True)
         return {"text": f"Error: {str(e)}"}
+
+
+def n8n_stats() -> Dict[str, Any]:
+    return {
+        "calls": stats.calls,
+        "attempts": stats.attempts,
+        "retries": stats.retries,
+        "hedges": stats.hedges,
+        "hedge_wins": stats.hedge_wins,
+        "budget_exhausted": stats.budget_exhausted,
+        "failed": stats.failed,
+        "max_attempts": N8N_MAX_ATTEMPTS,
+        "hedge_after_seconds": N8N_HEDGE_AFTER,
+        "turn_budget_seconds": N8N_TURN_BUDGET,
+        "retry_ambiguous": N8N_RETRY_AMBIGUOUS,
+        "recent": list(stats.recent),
+    }
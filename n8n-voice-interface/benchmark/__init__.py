@@ -0,0 +1,7 @@
+"""
+Offline load benchmark for the N8N Voice Interface.
+
+Starts local stand-ins for the OpenAI STT/TTS APIs and an n8n webhook, runs
+the backend against them and drives it with simulated users. Run with
+``python -m benchmark --help`` from the ``n8n-voice-interface`` directory.
+"""
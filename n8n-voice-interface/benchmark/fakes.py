@@ -0,0 +1,144 @@
+import time
+import socket
+import random
+import asyncio
+import threading
+from typing import Dict, Any
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Fake audio is streamed in chunks of this size
+AUDIO_CHUNK_SIZE = 16 * 1024
+# MPEG frame sync bytes, so clients sniffing the content see "mp3"
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+
+class FakeService:
+    """Latency, jitter, error rate and payload size of one stand-in upstream."""
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, size: int, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.size = size
+        self.requests = 0
+        self.errors = 0
+        # Seeded so repeated runs see the same sequence of delays and failures
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        return max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+
+    def nonce(self) -> str:
+        return f"{self._random.getrandbits(48):012x}"
+
+    def should_fail(self) -> bool:
+        self.requests += 1
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "error_rate": self.error_rate,
+            "size": self.size,
+        }
+
+
+def _filler(prefix: str, size: int) -> str:
+    words = (prefix + " lorem ipsum dolor sit amet. ") * (size // 20 + 1)
+    return words[:max(size, len(prefix))]
+
+
+def create_app(stt: FakeService, tts: FakeService, n8n: FakeService) -> FastAPI:
+    """
+    Build one app serving all stand-ins.
+
+    - ``POST /v1/audio/transcriptions``: parses the multipart upload, answers with
+      ``stt.size`` characters of text giving the size of the file part
+    - ``POST /v1/audio/speech``: streams ``tts.size`` bytes of MP3-looking audio
+    - ``POST /webhook``: answers with ``n8n.size`` characters, echoing the transcription
+
+    Latency is the time to the response headers. Failures are a 500 for STT
+    and TTS and a 503 for n8n, which the backend retries.
+    """
+    app = FastAPI()
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        # Parsed like the real API does, so a malformed (or truncated chunked) body is a 400
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str) or "model" not in form:
+            return JSONResponse({"error": {"message": "Missing 'file' or 'model'"}}, status_code=400)
+        received = len(await upload.read())
+        await asyncio.sleep(stt.delay())
+        if stt.should_fail():
+            return JSONResponse({"error": {"message": "Fake STT failure"}}, status_code=500)
+        return {"text": _filler(f"Benchmark utterance of {received} bytes", stt.size)}
+
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(tts.delay())
+        if tts.should_fail():
+            return JSONResponse({"error": {"message": "Fake TTS failure"}}, status_code=500)
+
+        async def audio():
+            remaining = tts.size
+            chunk = (MP3_FRAME * (AUDIO_CHUNK_SIZE // len(MP3_FRAME) + 1))[:AUDIO_CHUNK_SIZE]
+            while remaining > 0:
+                yield chunk[:remaining]
+                remaining -= AUDIO_CHUNK_SIZE
+                await asyncio.sleep(0)
+
+        media_type = "audio/mpeg" if payload.get("response_format", "mp3") == "mp3" else "application/octet-stream"
+        return StreamingResponse(audio(), media_type=media_type)
+
+    @app.post("/webhook")
+    async def webhook(body: dict):
+        await asyncio.sleep(n8n.delay())
+        if n8n.should_fail():
+            return JSONResponse({"error": "Fake n8n failure"}, status_code=503)
+        transcription = body.get("transcription", "")
+        # The reply is unique per turn, so the TTS cache does not hide synthesis cost
+        return {"text": _filler(f"Reply {n8n.nonce()} to: {transcription[:40]}", n8n.size)}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeServer:
+    """Runs the stand-in app with uvicorn in a background thread."""
+
+    def __init__(self, app: FastAPI, port: int):
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+        ))
+        self._thread = threading.Thread(target=self._server.run, name="benchmark-fakes", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 10.0):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake upstream server did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
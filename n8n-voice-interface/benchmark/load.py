@@ -0,0 +1,196 @@
+import io
+import math
+import time
+import wave
+import struct
+import asyncio
+import itertools
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+import httpx
+
+
+def make_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    """A mono 16-bit WAV with a 300 Hz tone, standing in for a recording."""
+    frames = int(seconds * sample_rate)
+    samples = (int(8000 * math.sin(2 * math.pi * 300 * i / sample_rate)) for i in range(frames))
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"".join(struct.pack("<h", sample) for sample in samples))
+    return output.getvalue()
+
+
+_recording_ids = itertools.count(1)
+
+
+def unique_recording(audio: bytes) -> bytes:
+    """
+    Make a recording differ from every other one by overwriting its last samples.
+
+    Otherwise every turn after the first would be answered from the
+    transcription cache and the benchmark would no longer measure STT.
+    """
+    return audio[:-8] + struct.pack("<Q", next(_recording_ids))
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Return {stage: milliseconds} from a Server-Timing header."""
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    stages[name] = float(value)
+                except ValueError:
+                    pass
+    return stages
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50": round(percentile(ordered, 0.50), 3),
+        "p95": round(percentile(ordered, 0.95), 3),
+        "p99": round(percentile(ordered, 0.99), 3),
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+class LoadResults:
+    """Samples (milliseconds) per stage and error counts collected by the simulated users."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.completed = 0
+        self.failed = 0
+
+    def add(self, stage: str, milliseconds: float):
+        self.samples[stage].append(milliseconds)
+
+    def error(self, kind: str):
+        self.errors[kind] += 1
+
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+async def run_turn(client: httpx.AsyncClient, audio: bytes, webhook_url: str, results: LoadResults,
+                   stream_reply: bool):
+    """
+    One voice turn, as the browser does it: upload the recording, then fetch the spoken reply.
+
+    Stages from the server's Server-Timing header are recorded as ``server_<stage>``;
+    ``transcribe``, ``tts_first_byte``, ``tts_total`` and ``turn`` are measured by the client.
+    """
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            "/api/transcribe",
+            data={"webhook_url": webhook_url},
+            files={"audio": ("recording.wav", unique_recording(audio), "audio/wav")}
+        )
+    except httpx.HTTPError as e:
+        results.error(f"transcribe:{type(e).__name__}")
+        results.failed += 1
+        return
+    results.add("transcribe", (time.perf_counter() - started) * 1000)
+    if response.status_code != 200:
+        results.error(f"transcribe:{response.status_code}")
+        results.failed += 1
+        return
+    for stage, milliseconds in parse_server_timing(response.headers.get("server-timing")).items():
+        results.add(f"server_{stage}", milliseconds)
+
+    reply = (response.json().get("n8nResponse") or {}).get("text")
+    if not reply:
+        results.error("n8n:no_reply")
+        results.failed += 1
+        return
+
+    tts_started = time.perf_counter()
+    try:
+        if stream_reply:
+            first_byte = None
+            # The POST registers the text; its audio_url streams the speech
+            response = await client.post("/api/speak/stream", json={"text": reply})
+            if response.status_code != 200:
+                results.error(f"tts:{response.status_code}")
+                results.failed += 1
+                return
+            async with client.stream("GET", response.json()["audio_url"]) as response:
+                if response.status_code != 200:
+                    results.error(f"tts:{response.status_code}")
+                    results.failed += 1
+                    return
+                async for _ in response.aiter_raw():
+                    if first_byte is None:
+                        first_byte = time.perf_counter()
+        else:
+            # /api/speak answers with a URL; the audio itself is a separate request
+            response = await client.post("/api/speak", json={"text": reply})
+            if response.status_code != 200:
+                results.error(f"tts:{response.status_code}")
+                results.failed += 1
+                return
+            audio_response = await client.get(response.json()["audio_url"])
+            if audio_response.status_code != 200:
+                results.error(f"audio:{audio_response.status_code}")
+                results.failed += 1
+                return
+            first_byte = time.perf_counter()
+    except httpx.HTTPError as e:
+        results.error(f"tts:{type(e).__name__}")
+        results.failed += 1
+        return
+
+    finished = time.perf_counter()
+    results.add("tts_first_byte", ((first_byte or finished) - tts_started) * 1000)
+    results.add("tts_total", (finished - tts_started) * 1000)
+    results.add("turn", (finished - started) * 1000)
+    results.completed += 1
+
+
+async def run_users(base_url: str, webhook_url: str, users: int, turns: int, audio: bytes,
+                    stream_reply: bool, think_time: float) -> LoadResults:
+    """
+    Run ``users`` simulated users concurrently, each doing ``turns`` turns in sequence.
+
+    Every user has its own client (and so its own session cookie).
+    """
+    results = LoadResults()
+
+    async def user():
+        async with httpx.AsyncClient(base_url=base_url, timeout=httpx.Timeout(120.0)) as client:
+            for _ in range(turns):
+                await run_turn(client, audio, webhook_url, results, stream_reply)
+                if think_time:
+                    await asyncio.sleep(think_time)
+
+    await asyncio.gather(*(user() for _ in range(users)))
+    return results
+
+
+def summarize_results(results: LoadResults, elapsed: float) -> Dict[str, Any]:
+    return {
+        "completed": results.completed,
+        "failed": results.failed,
+        "throughput_per_second": round(results.completed / elapsed, 3) if elapsed else 0.0,
+        "errors": dict(sorted(results.errors.items())),
+        "stages_ms": results.stages(),
+    }
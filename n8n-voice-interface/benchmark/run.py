@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Dict, Any, Optional
+import httpx
+from benchmark.fakes import FakeService, FakeServer, create_app, free_port
+from benchmark.load import make_wav, run_users, summarize_results
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+REPORT_SCHEMA_VERSION = 1
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Load-test the voice pipeline (/api/transcribe -> n8n -> TTS) against local stand-in servers."
+    )
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users (default: 10)")
+    parser.add_argument("--turns", type=int, default=10, help="Turns per user (default: 10)")
+    parser.add_argument("--audio-seconds", type=float, default=3.0, help="Length of the uploaded recording (default: 3)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause between a user's turns in seconds")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="Fetch replies via /api/speak and /api/audio instead of /api/speak/stream")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for upstream jitter and failures (default: 1)")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file (default: stdout only)")
+    parser.add_argument("--label", default="", help="Free-form label stored in the report")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment variable for the backend, e.g. --env TTS_CACHE_ENABLED=false")
+
+    for name, latency, size, size_help in (
+        ("stt", 0.8, 80, "characters of transcription"),
+        ("n8n", 0.3, 200, "characters of reply text"),
+        ("tts", 0.4, 48000, "bytes of audio"),
+    ):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency,
+                            help=f"{name.upper()} time to response in seconds (default: {latency})")
+        parser.add_argument(f"--{name}-jitter", type=float, default=latency / 4,
+                            help=f"{name.upper()} latency jitter, +/- seconds (default: {latency / 4})")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0,
+                            help=f"Fraction of {name.upper()} requests that fail (default: 0)")
+        parser.add_argument(f"--{name}-size", type=int, default=size,
+                            help=f"{name.upper()} payload: {size_help} (default: {size})")
+    return parser.parse_args(argv)
+
+
+def _service(args: argparse.Namespace, name: str, seed_offset: int) -> FakeService:
+    return FakeService(
+        latency=getattr(args, f"{name}_latency"),
+        jitter=getattr(args, f"{name}_jitter"),
+        error_rate=getattr(args, f"{name}_error_rate"),
+        size=getattr(args, f"{name}_size"),
+        seed=args.seed * 100 + seed_offset
+    )
+
+
+class ProcessSampler:
+    """Samples resident memory and open file descriptors of a process from /proc (Linux)."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.samples = []
+
+    def sample(self) -> Optional[Dict[str, int]]:
+        try:
+            with open(f"/proc/{self.pid}/status") as status:
+                rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+            fds = len(os.listdir(f"/proc/{self.pid}/fd"))
+        except (OSError, StopIteration):
+            return None
+        current = {"rss_bytes": rss_kb * 1024, "open_fds": fds}
+        self.samples.append(current)
+        return current
+
+    async def run(self, interval: float):
+        while True:
+            self.sample()
+            await asyncio.sleep(interval)
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.samples:
+            return {"available": False}
+        summary: Dict[str, Any] = {"available": True}
+        for key in ("rss_bytes", "open_fds"):
+            values = [sample[key] for sample in self.samples]
+            summary[key] = {
+                "start": values[0],
+                "end": values[-1],
+                "peak": max(values),
+                "growth": values[-1] - values[0],
+            }
+        return summary
+
+
+def start_backend(port: int, upstream_url: str, work_dir: str, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "benchmark",
+        "STT_API_URL": f"{upstream_url}/v1/audio/transcriptions",
+        "TTS_API_URL": f"{upstream_url}/v1/audio/speech",
+        "TTS_CACHE_DIR": os.path.join(work_dir, "tts-cache"),
+        "ARTIFACT_DIR": os.path.join(work_dir, "audio"),
+    })
+    env.update(extra_env)
+    log = open(os.path.join(work_dir, "backend.log"), "wb")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+async def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Backend exited with code {process.returncode}")
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Backend did not become ready")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    stt, n8n, tts = _service(args, "stt", 1), _service(args, "n8n", 2), _service(args, "tts", 3)
+    fakes = FakeServer(create_app(stt, tts, n8n), free_port())
+    fakes.start()
+
+    work_dir = tempfile.mkdtemp(prefix="voice-benchmark-")
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = start_backend(port, fakes.base_url, work_dir, extra_env)
+    sampler = ProcessSampler(process.pid)
+
+    try:
+        await wait_until_ready(base_url, process)
+        audio = make_wav(args.audio_seconds)
+        webhook_url = f"{fakes.base_url}/webhook"
+
+        # One warm-up turn so imports, pools and caches are not part of the measurement
+        await run_users(base_url, webhook_url, 1, 1, audio, not args.no_stream, 0)
+        sampler.sample()
+
+        sampling = asyncio.create_task(sampler.run(0.5))
+        started_at = time.time()
+        started = time.perf_counter()
+        results = await run_users(
+            base_url, webhook_url, args.users, args.turns, audio, not args.no_stream, args.think_time
+        )
+        elapsed = time.perf_counter() - started
+        sampling.cancel()
+        sampler.sample()
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        fakes.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "schema_version": REPORT_SCHEMA_VERSION,
+        "label": args.label,
+        "started_at": started_at,
+        "duration_seconds": round(elapsed, 3),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "git_commit": _git_commit(),
+        },
+        "config": {
+            "users": args.users,
+            "turns_per_user": args.turns,
+            "audio_seconds": args.audio_seconds,
+            "audio_bytes": len(audio),
+            "think_time": args.think_time,
+            "streamed_replies": not args.no_stream,
+            "seed": args.seed,
+            "backend_env": extra_env,
+            "upstreams": {"stt": stt.as_dict(), "n8n": n8n.as_dict(), "tts": tts.as_dict()},
+        },
+        "upstream_requests": {
+            "stt": {"requests": stt.requests, "errors": stt.errors},
+            "n8n": {"requests": n8n.requests, "errors": n8n.errors},
+            "tts": {"requests": tts.requests, "errors": tts.errors},
+        },
+        "results": summarize_results(results, elapsed),
+        "backend_process": sampler.summary(),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(benchmark(args))
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    results = report["results"]
+    print(output if not args.output else f"Report written to {args.output}")
+    print(
+        f"{results['completed']} turns, {results['failed']} failed, "
+        f"{results['throughput_per_second']} turns/s, "
+        f"turn p95 {results['stages_ms'].get('turn', {}).get('p95', 0)} ms",
+        file=sys.stderr
+    )
@@ -604,8 +604,11 @@ window.processRecording = async function(audioBlob, recordingId, fileExtension =
         
         // Create form data for the API request
         const formData = new FormData();
-        formData.append('audio', audioBlob, `recording-${recordingId}${fileExtension}`);
+        // Pola tekstowe przed plikiem - backend sprawdza je, zanim zacznie transkrypcję
         formData.append('webhook_url', webhookUrl);
+        // Poproś o gotowy adres audio odpowiedzi - bez osobnego żądania /api/speak
+        formData.append('response_audio', 'stream');
+        formData.append('audio', audioBlob, `recording-${recordingId}${fileExtension}`);
         
         console.log(`Wysyłanie nagrania ${recordingId} jako ${fileExtension}, typ MIME: ${audioBlob.type}`);
         
@@ -634,7 +637,7 @@ window.processRecording = async function(audioBlob, recordingId, fileExtension =
         // Process the response from n8n
         if (data.n8nResponse && data.n8nResponse.text) {
             console.log(`Otrzymano natychmiastową odpowiedź dla nagrania #${recordingId}`);
-            await window.handleN8nResponse(data.n8nResponse.text, entryId);
+            await window.handleN8nResponse(data.n8nResponse.text, entryId, data.audio_url || null);
         } else {
             // Try to get the response via last-response-tts endpoint
             try {
@@ -677,8 +680,9 @@ window.processRecording = async function(audioBlob, recordingId, fileExtension =
 window.handleN8nResponse = async function(text, entryId, audioUrl = null) {
     try {
         if (!audioUrl) {
-            // Convert text to speech
-            const response = await fetch('/api/speak', {
+            // Strumieniuj audio - odtwarzanie zaczyna się, zanim synteza się zakończy.
+            // Serwer sam decyduje, czy długi tekst zsyntezować w całości.
+            const response = await fetch('/api/speak/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The backend modules import each other by bare name, as when run from backend/
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "backend"))
+sys.path.insert(0, ROOT_DIR)
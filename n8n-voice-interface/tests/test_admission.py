@@ -0,0 +1,50 @@
+"""
+Load shedding by the upstream admission limiter.
+"""
+import asyncio
+import pytest
+from admission import UpstreamLimiter, Overloaded
+
+
+async def _hold_slots(limiter: UpstreamLimiter, count: int):
+    return [await limiter.acquire() for _ in range(count)]
+
+
+def test_full_queue_is_rejected_immediately():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=1, max_queue=1, queue_timeout=5)
+        held = await _hold_slots(limiter, 1)
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(Overloaded) as rejected:
+            await limiter.acquire()
+
+        held[0].release()
+        (await queued).release()
+        return limiter, rejected.value
+
+    limiter, error = asyncio.run(scenario())
+
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "5"
+    assert limiter.rejected_queue_full == 1
+    assert limiter.admitted == 2
+
+
+def test_wait_over_queue_timeout_is_rejected():
+    async def scenario():
+        limiter = UpstreamLimiter("test", max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        held = await _hold_slots(limiter, 1)
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+        held[0].release()
+        # The slot is usable again once released
+        async with limiter.limit():
+            pass
+        return limiter
+
+    limiter = asyncio.run(scenario())
+
+    assert limiter.rejected_timeout == 1
+    assert limiter.stats()["in_flight"] == 0
@@ -0,0 +1,54 @@
+"""
+State transitions of the per-webhook circuit breaker.
+"""
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("n8n.test", failure_threshold=2, reset_timeout=60)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+
+    breaker.record(False)
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.short_circuited == 1
+
+
+def test_half_open_allows_one_probe():
+    breaker = CircuitBreaker("n8n.test", failure_threshold=1, reset_timeout=0)
+    breaker.record(False)
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one trial request at a time
+    assert not breaker.allow()
+
+
+def test_probe_outcome_closes_or_reopens():
+    breaker = CircuitBreaker("n8n.test", failure_threshold=3, reset_timeout=0)
+    for _ in range(3):
+        breaker.record(False)
+
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_shed_request_does_not_count():
+    breaker = CircuitBreaker("n8n.test", failure_threshold=1, reset_timeout=0)
+    breaker.record(False)
+    assert breaker.allow()
+
+    breaker.record(None)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
@@ -0,0 +1,85 @@
+"""
+Transcription cache hits and shared transcriptions against the stand-in STT API.
+"""
+import asyncio
+import pytest
+from fastapi import HTTPException
+import stt
+import http_client
+from stt_cache import TranscriptCache
+from benchmark.fakes import FakeService, FakeServer, create_app, free_port
+
+
+@pytest.fixture
+def fake_stt(monkeypatch):
+    services = [FakeService(latency=0.2, jitter=0.0, error_rate=0.0, size=40, seed=seed) for seed in range(3)]
+    server = FakeServer(create_app(*services), free_port())
+    server.start()
+    monkeypatch.setattr(stt, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(stt, "API_URL", f"{server.base_url}/v1/audio/transcriptions")
+    monkeypatch.setattr(stt, "stt_cache", TranscriptCache(ttl=60, max_entries=10))
+    try:
+        yield services[0]
+    finally:
+        server.stop()
+
+
+async def _chunks(recording: bytes):
+    for start in range(0, len(recording), 4096):
+        yield recording[start:start + 4096]
+
+
+def _transcribe(recording: bytes):
+    return stt.transcribe_stream(_chunks(recording), content_type="audio/wav")
+
+
+def _provider_requests() -> int:
+    return http_client.pool_stats().get("requests", 0)
+
+
+def test_cache_hit_does_not_call_provider(fake_stt):
+    recording = b"RIFF" + b"\x03" * 20000
+
+    async def run():
+        try:
+            first = await _transcribe(recording)
+            requests = _provider_requests()
+            second = await _transcribe(recording)
+            return first, second, _provider_requests() - requests
+        finally:
+            await http_client.close_client()
+
+    first, second, extra_requests = asyncio.run(run())
+
+    assert second == first
+    assert extra_requests == 0
+    assert stt.stt_cache.hits == 1
+
+
+def test_identical_recordings_share_one_transcription(fake_stt):
+    recording = b"RIFF" + b"\x04" * 20000
+
+    async def run():
+        try:
+            return await asyncio.gather(_transcribe(recording), _transcribe(recording), _transcribe(recording))
+        finally:
+            await http_client.close_client()
+
+    results = asyncio.run(run())
+
+    assert results[0] == results[1] == results[2]
+    assert fake_stt.requests == 1
+    assert stt.stt_cache.joined == 2
+
+
+def test_empty_recording_is_rejected(fake_stt):
+    async def run():
+        try:
+            return await _transcribe(b"")
+        finally:
+            await http_client.close_client()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 400
+    assert fake_stt.requests == 0
@@ -0,0 +1,107 @@
+"""
+Parallel transcriptions against a local stand-in for the OpenAI STT API.
+"""
+import time
+import asyncio
+import pytest
+import stt
+import http_client
+from admission import UpstreamLimiter
+from benchmark.fakes import FakeService, FakeServer, create_app, free_port
+
+STT_LATENCY = 0.5
+PARALLEL_CALLS = 6
+
+
+@pytest.fixture
+def fake_stt(monkeypatch):
+    services = {
+        name: FakeService(latency=STT_LATENCY, jitter=0.0, error_rate=0.0, size=40, seed=seed)
+        for seed, name in enumerate(("stt", "tts", "n8n"))
+    }
+    server = FakeServer(create_app(services["stt"], services["tts"], services["n8n"]), free_port())
+    server.start()
+    monkeypatch.setattr(stt, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(stt, "API_URL", f"{server.base_url}/v1/audio/transcriptions")
+    try:
+        yield services["stt"]
+    finally:
+        server.stop()
+
+
+async def _chunks(recording: bytes):
+    for start in range(0, len(recording), 4096):
+        yield recording[start:start + 4096]
+
+
+async def _transcribe_in_parallel(count: int):
+    try:
+        # Distinct recordings, so no call is answered from the transcription cache
+        recordings = [b"RIFF" + bytes([index]) * 20000 for index in range(count)]
+        return await asyncio.gather(*(
+            stt.transcribe_stream(_chunks(recording), content_type="audio/wav", filename=f"{index}.wav")
+            for index, recording in enumerate(recordings)
+        ))
+    finally:
+        await http_client.close_client()
+
+
+def test_parallel_transcriptions_overlap(fake_stt):
+    started = time.monotonic()
+    results = asyncio.run(_transcribe_in_parallel(PARALLEL_CALLS))
+    elapsed = time.monotonic() - started
+
+    assert len(results) == PARALLEL_CALLS
+    assert all(result["text"].startswith("Benchmark utterance") for result in results)
+    assert fake_stt.requests == PARALLEL_CALLS
+    # Serialized calls would take PARALLEL_CALLS * STT_LATENCY
+    assert elapsed < STT_LATENCY * 2
+
+
+async def _slow_upload_and_quick_upload(release_upload: asyncio.Event):
+    async def slow_chunks():
+        yield b"RIFF" + b"\x01" * 4096
+        # The user is still talking
+        await release_upload.wait()
+        yield b"\x01" * 4096
+
+    try:
+        slow = asyncio.create_task(stt.transcribe_stream(slow_chunks(), content_type="audio/wav"))
+        await asyncio.sleep(0.2)
+        started = time.monotonic()
+        quick = await stt.transcribe_stream(_chunks(b"RIFF" + b"\x02" * 8192), content_type="audio/wav")
+        quick_elapsed = time.monotonic() - started
+        release_upload.set()
+        await slow
+        return quick, quick_elapsed
+    finally:
+        await http_client.close_client()
+
+
+def test_upload_in_progress_does_not_hold_stt_slot(fake_stt, monkeypatch):
+    # One slot, and a short queue timeout that a held slot would exceed
+    monkeypatch.setattr(stt, "stt_limiter", UpstreamLimiter("STT", 1, 4, STT_LATENCY * 2))
+
+    quick, quick_elapsed = asyncio.run(_slow_upload_and_quick_upload(asyncio.Event()))
+
+    assert quick["text"].startswith("Benchmark utterance")
+    assert quick_elapsed < STT_LATENCY * 2
+    assert fake_stt.requests == 2
+
+
+async def _transcribe_chunked(recording: bytes):
+    try:
+        return await stt.transcribe_stream(_chunks(recording), content_type="audio/wav", filename="chunked.wav")
+    finally:
+        await http_client.close_client()
+
+
+def test_upload_without_cache_is_sent_chunked(fake_stt, monkeypatch):
+    # No cache and no preprocessing: the size is unknown, so the body goes out chunked
+    monkeypatch.setattr(stt, "stt_cache", None)
+    recording = b"RIFF" + b"\x03" * 50000
+
+    result = asyncio.run(_transcribe_chunked(recording))
+
+    assert result["text"].startswith(f"Benchmark utterance of {len(recording)} bytes")
+    assert fake_stt.requests == 1
@@ -0,0 +1,80 @@
+"""
+Size- and count-bounded eviction of the disk TTS cache.
+"""
+import os
+import tts_cache as tts_cache_module
+from tts_cache import TTSCache
+
+
+def _cache(tmp_path, max_bytes=1000, max_entries=10):
+    return TTSCache(str(tmp_path / "cache"), max_bytes=max_bytes, max_entries=max_entries)
+
+
+def test_least_recently_used_entry_is_evicted_by_count(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    evicted = []
+    cache.on_evict.append(evicted.append)
+    first = cache.put("a", b"1" * 10, "mp3")
+    cache.put("b", b"2" * 10, "mp3")
+
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == first
+    cache.put("c", b"3" * 10, "mp3")
+
+    assert evicted == ["b.mp3"]
+    assert cache.get("b") is None
+    assert not os.path.exists(os.path.join(cache.cache_dir, "b.mp3"))
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_are_evicted_until_within_byte_budget(tmp_path):
+    cache = _cache(tmp_path, max_bytes=250)
+    for key in ("a", "b", "c"):
+        cache.put(key, b"x" * 100, "mp3")
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 200
+    assert cache.get("a") is None
+
+
+def test_oversized_clip_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts_cache_module, "ARTIFACT_DIR", str(tmp_path))
+    cache = _cache(tmp_path, max_bytes=100)
+    kept = cache.put("small", b"s" * 50, "mp3")
+
+    path = cache.put("large", b"L" * 500, "mp3")
+
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.getsize(path) == 500
+    assert cache.get("large") is None
+    # Nothing was evicted to make room for it
+    assert cache.get("small") == kept
+    assert cache.stats()["evictions"] == 0
+
+
+def test_file_removed_behind_the_cache_is_a_miss(tmp_path):
+    cache = _cache(tmp_path)
+    evicted = []
+    cache.on_evict.append(evicted.append)
+    os.remove(cache.put("a", b"1" * 10, "mp3"))
+
+    assert cache.get("a") is None
+    assert evicted == ["a.mp3"]
+    assert cache.stats()["bytes"] == 0
+
+
+def test_index_keeps_lru_order_across_restarts(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.put("a", b"1" * 10, "mp3")
+    cache.put("b", b"2" * 10, "mp3")
+    cache.get("a")
+    cache.flush()
+
+    reloaded = _cache(tmp_path, max_entries=2)
+    reloaded.put("c", b"3" * 10, "mp3")
+
+    assert reloaded.get("b") is None
+    assert reloaded.get("a") is not None
+    reloaded.flush()
@@ -0,0 +1,88 @@
+"""
+Which n8n webhook failures are retried, against a scripted mock transport.
+"""
+import asyncio
+import httpx
+import pytest
+import webhook
+
+WEBHOOK_URL = "http://n8n.test/webhook/voice"
+
+
+@pytest.fixture
+def scripted_n8n(monkeypatch):
+    """Answer webhook calls from a list of outcomes: a status code or an exception to raise."""
+    outcomes = []
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        outcome = outcomes.pop(0) if outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={"text": f"reply {len(requests)}"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(webhook, "get_client", lambda: client)
+    monkeypatch.setattr(webhook, "N8N_BREAKER_ENABLED", False)
+    monkeypatch.setattr(webhook, "N8N_BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(webhook, "N8N_HEDGE_AFTER", 0.0)
+    monkeypatch.setattr(webhook, "N8N_MAX_ATTEMPTS", 3)
+    yield outcomes, requests
+    asyncio.run(client.aclose())
+
+
+def _send():
+    return asyncio.run(webhook.send_to_n8n(WEBHOOK_URL, {"transcription": "hello"}))
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_refused_request_is_retried(scripted_n8n, status):
+    outcomes, requests = scripted_n8n
+    outcomes.extend([status, 200])
+
+    assert _send() == {"text": "reply 2"}
+    assert len(requests) == 2
+
+
+def test_connect_error_is_retried(scripted_n8n):
+    outcomes, requests = scripted_n8n
+    outcomes.extend([httpx.ConnectError("connection refused"), 200])
+
+    assert _send() == {"text": "reply 2"}
+    assert len(requests) == 2
+
+
+@pytest.mark.parametrize("status", [500, 502, 504])
+def test_ambiguous_status_is_not_retried(scripted_n8n, status):
+    outcomes, requests = scripted_n8n
+    outcomes.append(status)
+
+    assert _send() is False
+    assert len(requests) == 1
+
+
+@pytest.mark.parametrize("error", [httpx.RemoteProtocolError("peer closed"), httpx.ReadTimeout("slow")])
+def test_error_after_request_was_sent_is_not_retried(scripted_n8n, error):
+    outcomes, requests = scripted_n8n
+    outcomes.extend([error, 200])
+
+    assert "Error connecting to webhook" in _send()["text"]
+    assert len(requests) == 1
+
+
+def test_gateway_errors_retried_when_opted_in(scripted_n8n, monkeypatch):
+    outcomes, requests = scripted_n8n
+    monkeypatch.setattr(webhook, "RETRYABLE_STATUS", webhook.RETRYABLE_STATUS + (502, 504))
+    outcomes.extend([502, 504, 200])
+
+    assert _send() == {"text": "reply 3"}
+    assert len(requests) == 3
+
+
+def test_attempts_are_capped(scripted_n8n):
+    outcomes, requests = scripted_n8n
+    outcomes.extend([503, 503, 503, 200])
+
+    assert _send() is False
+    assert len(requests) == 3
@@ -5,7 +5,7 @@ echo "Setting up N8N Voice Interface..."
 
 # Install dependencies using pip with --user flag
 echo "Installing Python dependencies..."
-pip install fastapi==0.103.1 uvicorn==0.23.2 python-multipart==0.0.6 httpx==0.26.0 requests==2.31.0 python-dotenv==1.0.0 pydantic==2.3.0 pydub==0.25.1 --user
+pip install fastapi==0.103.1 uvicorn==0.23.2 websockets==11.0.3 python-multipart==0.0.6 httpx==0.26.0 requests==2.31.0 python-dotenv==1.0.0 pydantic==2.3.0 pydub==0.25.1 --user
 
 # Create required directories
 echo "Creating temporary directories..."